@@ -1,28 +1,86 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from typing import List, Optional
-import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import datetime
+import hashlib
+import logging
+import os
+import time
+
+from cache import TTLCache
+from passwords import hash_password, verify_password
+from metrics import MongoCommandMetrics
+from routes.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NDJSON_MEDIA_TYPE, STREAM_BATCH_SIZE, set_next_cursor
 
 # Initialize APIRouter
 router = APIRouter()
 
-# Database connection
-client = pymongo.MongoClient("mongodb://localhost:27017/")
-db = client["codebar"]
-users_collection = db["users"]
+# Database connection settings
+MONGO_URI = os.getenv("AUTH_MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DATABASE = os.getenv("AUTH_MONGO_DATABASE", "codebar")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+
+# Set by init_mongo() from the app lifespan
+client = None
+users_collection = None
+username_index = False  # Whether the unique index on username is in place
+
+# Connect to Mongo. Tests can pass an in-process stand-in (e.g.
+# mongomock_motor.AsyncMongoMockClient) instead. The unique index on
+# username is built by `python -m migrations.unique_usernames`; until it
+# has run, sign-ups and renames check for the name before writing.
+async def init_mongo(mongo_client=None):
+    global client, users_collection, username_index
+    client = mongo_client or AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        event_listeners=[MongoCommandMetrics()],  # Command timings for /metrics
+    )
+    users_collection = client[MONGO_DATABASE]["users"]
+    try:
+        index = (await users_collection.index_information()).get("username_1")
+        username_index = bool(index and index.get("unique"))
+    except PyMongoError as error:
+        logging.error(f"Couldn't read the users indexes: {error}")
+        username_index = False
+    if not username_index:
+        logging.error("users.username has no unique index; run `python -m migrations.unique_usernames`")
+
+# Without the unique index, a name that's already taken has to be looked up
+async def check_username_free(username: str):
+    if not username_index and await users_collection.find_one({"username": username}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Username already exists")
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def close_mongo():
+    if client is not None:
+        client.close()
 
 # JWT settings
 SECRET_KEY = "1c0d3b4r"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Validated tokens (keyed by SHA-256 digest) and user records, kept in memory
+# so protected routes skip the signature check and the Mongo round trip
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 # Pydantic models
 class PublicUser(BaseModel):
     username: str
@@ -44,43 +102,68 @@ class UserUpdate(BaseModel):
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 # Dependency to get the current user from the token
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    username = token_cache.get(digest)
+    if username is not None:
+        return username
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return username
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Never keep a token cached past its own expiry
+    expires = payload.get("exp")
+    token_cache.set(digest, username, ttl=expires - time.time() if expires is not None else None)
+    return username
+
+# Look up a user record, going to Mongo only on a cache miss
+async def get_user(username: str):
+    user = user_cache.get(username)
+    if user is None:
+        user = await users_collection.find_one({"username": username})
+        if user is not None:
+            user_cache.set(username, user)
+    return user
+
 # Endpoint to register a new user
 @router.post("/register/")
 async def register(user: User):
-    # Check if the username already exists
-    existing_user = users_collection.find_one({"username": user.username})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already exists")
+    await check_username_free(user.username)
 
     # Hash the password and save the user
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await hash_password(user.password)
     user_data = user.dict()
     user_data["password"] = hashed_password  # Replace plain-text password with hashed password
-    users_collection.insert_one(user_data)
+    try:
+        await users_collection.insert_one(user_data)
+    except DuplicateKeyError:  # The unique index on username rejects existing names (and races)
+        raise HTTPException(status_code=400, detail="Username already exists")
+    user_cache.pop(user.username)
     return {"message": "User created"}
 
 # Endpoint to log in and get a JWT token
 @router.post("/login/")
 async def login(login_data: LoginData):
     # Find the user in the database
-    user = users_collection.find_one({"username": login_data.username})
+    user = await users_collection.find_one({"username": login_data.username})
     if not user:
         raise HTTPException(status_code=400, detail="Invalid username or password")
 
     # Verify the password
-    if not pwd_context.verify(login_data.password, user["password"]):
+    valid, new_hash = await verify_password(login_data.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid username or password")
 
+    # Upgrade the stored hash if the bcrypt cost factor has changed
+    if new_hash:
+        await users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        user_cache.pop(user["username"])
+
     # Generate a JWT token
     access_token_expires = datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = jwt.encode(
@@ -96,25 +179,68 @@ async def login(login_data: LoginData):
 async def protected_route(current_user: str = Depends(get_current_user)):
     return {"message": f"Hello, {current_user}. This is a protected route."}
 
+# Users are paged by their ObjectId, which increases with insertion order
+def users_page_query(after_id: Optional[str]):
+    if after_id is None:
+        return {}
+    try:
+        return {"_id": {"$gt": ObjectId(after_id)}}
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/users/", response_model=List[PublicUser])
-async def get_all_users():
-    users = users_collection.find({}, {"password": 0})  # Exclude passwords
-    return list(users)
+async def get_all_users(
+    response: Response,
+    after_id: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+):
+    query = users_page_query(after_id)
+    if stream:
+        users = users_collection.find(query, {"_id": 0, "username": 1, "role": 1}, batch_size=STREAM_BATCH_SIZE).sort("_id", 1)
+        if limit:
+            users = users.limit(limit)
+
+        async def lines():
+            async for user in users:
+                yield PublicUser(**user).model_dump_json() + "\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    cursor = users_collection.find(query, {"password": 0}).sort("_id", 1).limit(limit)  # Exclude passwords
+    users = await cursor.to_list(length=limit)
+    set_next_cursor(response, users[-1]["_id"] if users else None, len(users), limit)
+    return users
 
 @router.put("/users/me/")
 async def update_user_info(
     updated_data: UserUpdate, current_user: str = Depends(get_current_user)
 ):
-    user = users_collection.find_one({"username": current_user})
+    user = await get_user(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Hash the password if it is being updated
     if updated_data.password:
-        updated_data.password = pwd_context.hash(updated_data.password)
+        updated_data.password = await hash_password(updated_data.password)
+
+    if updated_data.username and updated_data.username != current_user:
+        await check_username_free(updated_data.username)
 
     # Update the user's information
-    users_collection.update_one(
-        {"username": current_user}, {"$set": updated_data.dict(exclude_unset=True)}
-    )
-    return {"message": "User information updated successfully"}
\ No newline at end of file
+    try:
+        await users_collection.update_one(
+            {"username": current_user}, {"$set": updated_data.dict(exclude_unset=True)}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    user_cache.pop(current_user)
+    if updated_data.username:
+        user_cache.pop(updated_data.username)
+    return {"message": "User information updated successfully"}
+
+# Hit/miss counters for the token and user caches
+@router.get("/auth/cache-stats/")
+async def auth_cache_stats():
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
\ No newline at end of file
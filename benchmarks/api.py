@@ -0,0 +1,358 @@
+# Load test for main.app, run in-process over an ASGI transport.
+#
+# The engine is pointed at a seeded SQLite file and auth.users_collection is
+# replaced by an in-memory stand-in, so no MySQL or Mongo is needed. Each
+# scenario runs at each concurrency level for a fixed duration; results are
+# printed and saved as JSON, and can be compared with an earlier run.
+#
+#     python -m benchmarks.api --rows 10000 --concurrency 1,16,64 --duration 10
+#     python -m benchmarks.api --rows 10000 --baseline bench_results.json \
+#         --output new.json
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+DEFAULT_DB_DIR = os.path.join(os.path.dirname(__file__), ".data")
+
+# Roster sizes used when seeding workshops
+INSTRUCTORS_PER_WORKSHOP = 1
+STUDENTS_PER_WORKSHOP = 5
+
+# Bump when the schema or seed data changes, so cached databases are rebuilt
+SEED_VERSION = 4
+
+BENCH_USERS = 10
+BENCH_PASSWORD = "bench-password"
+
+# In-memory stand-in for the motor users collection, covering the calls
+# auth.py makes
+class MemoryCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:length]
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class MemoryUsers:
+    def __init__(self):
+        self.docs = {}
+        self.next_id = itertools.count(1)
+
+    async def index_information(self):
+        return {"username_1": {"key": [("username", 1)], "unique": True}}  # Keyed by username
+
+    async def find_one(self, query, projection=None):
+        doc = self.docs.get(query.get("username"))
+        return dict(doc) if doc else None
+
+    async def insert_one(self, doc):
+        from pymongo.errors import DuplicateKeyError
+
+        if doc["username"] in self.docs:
+            raise DuplicateKeyError("duplicate username")
+        self.docs[doc["username"]] = {**doc, "_id": next(self.next_id)}
+
+    async def update_one(self, query, update):
+        doc = next((d for d in self.docs.values() if all(d.get(k) == v for k, v in query.items())), None)
+        if doc:
+            doc.update(update["$set"])
+
+    def find(self, query=None, projection=None, batch_size=None):
+        return MemoryCursor([{k: v for k, v in doc.items() if k != "password"} for doc in self.docs.values()])
+
+class MemoryMongo:
+    def __init__(self):
+        self.databases = {}
+
+    def __getitem__(self, name):
+        return self.databases.setdefault(name, {"users": MemoryUsers()})
+
+    def close(self):
+        pass
+
+# Create and fill the SQLite file once per row count; later runs reuse it
+def seed_database(path, rows, instructors=None, workshops=None):
+    instructors = rows if instructors is None else instructors
+    workshops = rows if workshops is None else workshops
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    # The schema comes from the same migration a deployment runs
+    subprocess.run(
+        [sys.executable, "-m", "migrations.create_schema"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**os.environ, "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path}"},
+        check=True,
+        capture_output=True,
+    )
+
+    rng = random.Random(42)
+    skills = ["python", "sql", "react", "javascript", "teaching", "design", "testing", "devops"]
+    reasons = ["career change", "curiosity", "promotion", "side project", "community"]
+    conn = sqlite3.connect(tmp_path)
+    batch = 10_000
+    for start in range(1, max(rows, instructors, workshops) + 1, batch):
+        def ids(count):
+            return range(start, min(start + batch, count + 1))
+
+        conn.executemany(
+            "INSERT INTO students (id, name, reasons, picture) VALUES (?, ?, ?, ?)",
+            ((i, f"student {i}", json.dumps(rng.sample(reasons, 2)), f"https://example.com/{i}.jpg") for i in ids(rows)),
+        )
+        conn.executemany(
+            "INSERT INTO instructors (id, name, bio, skills) VALUES (?, ?, ?, ?)",
+            ((i, f"instructor {i}", "Volunteer coach", json.dumps(rng.sample(skills, 3))) for i in ids(instructors)),
+        )
+        conn.executemany(
+            "INSERT INTO workshops (id, subject, date, description) VALUES (?, ?, ?, ?)",
+            ((i, f"workshop {i}", f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} 18:30:00.000000", "An evening workshop") for i in ids(workshops)),
+        )
+        conn.executemany(
+            "INSERT INTO workshop_instructors (workshop_id, instructor_id) VALUES (?, ?)",
+            ((i, rng.randint(1, instructors)) for i in ids(workshops) for _ in range(INSTRUCTORS_PER_WORKSHOP)),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO workshop_students (workshop_id, student_id) VALUES (?, ?)",
+            ((i, rng.randint(1, rows)) for i in ids(workshops) for _ in range(STUDENTS_PER_WORKSHOP)),
+        )
+        conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+# Point the app at the seeded database and the in-memory users collection
+async def build_app(db_path):
+    import auth
+    import logging
+    from main import app
+    from models.database import init_engine
+
+    logging.getLogger().setLevel(logging.WARNING)  # The routers log every request at INFO
+
+    engine = await init_engine(f"sqlite+aiosqlite:///{db_path}")
+    await auth.init_mongo(mongo_client=MemoryMongo())
+    return app, engine
+
+# Tracks the highest resident set size seen while a scenario runs
+class RSSSampler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def current(self):
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * self._page_size
+        except OSError:  # Not Linux: fall back to the process-wide peak
+            scale = 1 if sys.platform == "darwin" else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    async def run(self):
+        while True:
+            self.peak = max(self.peak, self.current())
+            await asyncio.sleep(self.interval)
+
+# Request factories, one per endpoint; each returns
+# (label, method, url, kwargs)
+def make_requests(rows, tokens):
+    def list_students():
+        return "GET /students/", "GET", "/students/", {"params": {"limit": 100, "after_id": random.randint(0, rows - 100)}}
+
+    def list_instructors():
+        return "GET /instructors/", "GET", "/instructors/", {"params": {"limit": 100}}
+
+    def list_workshops():
+        return "GET /workshops/", "GET", "/workshops/", {"params": {"limit": 100, "after_id": random.randint(0, rows - 100)}}
+
+    def student_detail():
+        return "GET /students/{id}", "GET", f"/students/{random.randint(1, rows)}", {}
+
+    def workshop_detail():
+        return "GET /workshops/{id}", "GET", f"/workshops/{random.randint(1, rows)}", {}
+
+    def create_student():
+        body = {"name": f"bench {uuid.uuid4().hex}", "reasons": ["benchmark"]}
+        return "POST /students/", "POST", "/students/", {"json": body}
+
+    def login():
+        body = {"username": f"bench{random.randrange(BENCH_USERS)}", "password": BENCH_PASSWORD}
+        return "POST /login/", "POST", "/login/", {"json": body}
+
+    def protected():
+        headers = {"Authorization": f"Bearer {random.choice(tokens)}"}
+        return "GET /protected/", "GET", "/protected/", {"headers": headers}
+
+    return {
+        "list": [(list_students, 2), (list_instructors, 1), (list_workshops, 2)],
+        "detail": [(student_detail, 1), (workshop_detail, 1)],
+        "create": [(create_student, 1)],
+        "login": [(login, 1)],
+        "protected": [(protected, 1)],
+        "mix": [
+            (list_students, 15), (list_instructors, 10), (list_workshops, 15),
+            (student_detail, 20), (workshop_detail, 15),
+            (create_student, 10), (login, 5), (protected, 10),
+        ],
+    }
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, statuses, elapsed):
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "throughput_rps": round(len(values) / elapsed, 1),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2),
+        "errors": sum(1 for status in statuses if status >= 400),
+    }
+
+async def run_scenario(client, factories, concurrency, duration):
+    choices, weights = zip(*factories)
+    per_endpoint = {}
+    sampler = RSSSampler()
+    sampler_task = asyncio.create_task(sampler.run())
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            label, method, url, kwargs = random.choices(choices, weights)[0]()
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latency = time.perf_counter() - start
+            latencies, statuses = per_endpoint.setdefault(label, ([], []))
+            latencies.append(latency)
+            statuses.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    sampler_task.cancel()
+
+    all_latencies = [l for latencies, _ in per_endpoint.values() for l in latencies]
+    all_statuses = [s for _, statuses in per_endpoint.values() for s in statuses]
+    return {
+        "overall": summarize(all_latencies, all_statuses, elapsed),
+        "endpoints": {label: summarize(l, s, elapsed) for label, (l, s) in sorted(per_endpoint.items())},
+        "peak_rss_mb": round(sampler.peak / 2**20, 1),
+    }
+
+# Register the benchmark users and collect a token for each
+async def prepare_users(client):
+    tokens = []
+    for i in range(BENCH_USERS):
+        user = {"username": f"bench{i}", "password": BENCH_PASSWORD, "role": "student"}
+        await client.post("/register/", json=user)
+        response = await client.post("/login/", json={"username": user["username"], "password": BENCH_PASSWORD})
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+def compare(results, baseline):
+    print("\nChange against baseline (throughput / p95):")
+    for key, run in results["runs"].items():
+        old = baseline.get("runs", {}).get(key)
+        if old is None:
+            continue
+        for label, stats in run["endpoints"].items():
+            before = old["endpoints"].get(label)
+            if not before:
+                continue
+            rps = (stats["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100
+            p95 = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            print(f"  {key:<16} {label:<22} throughput {rps:+7.1f}%   p95 {p95:+7.1f}%")
+
+async def main(args):
+    import httpx
+
+    db_path = os.path.join(args.db_dir, f"bench_{args.rows}_v{SEED_VERSION}.db")
+    seed_database(db_path, args.rows)
+    app, engine = await build_app(db_path)
+
+    transport = httpx.ASGITransport(app=app)
+    results = {
+        "rows": args.rows,
+        "duration_s": args.duration,
+        "python": sys.version.split()[0],
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": {},
+    }
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        tokens = await prepare_users(client)
+        scenarios = make_requests(args.rows, tokens)
+        for name in args.scenarios.split(","):
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                run = await run_scenario(client, scenarios[name], concurrency, args.duration)
+                results["runs"][f"{name}@{concurrency}"] = run
+                overall = run["overall"]
+                print(
+                    f"{name:<10} c={concurrency:<4} {overall['throughput_rps']:>9} req/s  "
+                    f"p50 {overall['p50_ms']:>8} ms  p95 {overall['p95_ms']:>8} ms  p99 {overall['p99_ms']:>8} ms  "
+                    f"peak RSS {run['peak_rss_mb']} MB  errors {overall['errors']}"
+                )
+                for label, stats in run["endpoints"].items():
+                    print(f"    {label:<22} {stats['throughput_rps']:>9} req/s  p95 {stats['p95_ms']:>8} ms")
+    await engine.dispose()
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(results, json.load(baseline))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="In-process load test for the API")
+    parser.add_argument("--rows", type=int, default=10_000, help="rows seeded per table (10k-1M)")
+    parser.add_argument("--concurrency", default="1,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and level")
+    parser.add_argument("--scenarios", default="list,detail,create,login,protected,mix")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--db-dir", default=DEFAULT_DB_DIR, help="where seeded SQLite files are kept")
+    parser.add_argument("--no-response-cache", action="store_true", help="measure with the GET response cache off")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"  # Read when response_cache is imported
+    random.seed(1)
+    asyncio.run(main(args))
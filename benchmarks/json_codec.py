@@ -0,0 +1,76 @@
+# Per-row cost of decoding the JSON list columns on a 100k-row list:
+# the old per-row json.loads loop in the handlers versus the JSONList
+# column type.
+#
+#     python -m benchmarks.json_codec [rows]
+import gc
+import json
+import sys
+import time
+
+from sqlalchemy import Column, Integer, String, create_engine, insert, select
+from sqlalchemy.orm import Session, declarative_base
+
+from models.base import Base
+from models.instructors import Instructor
+
+# The same table, mapped the way it was before JSONList
+LegacyBase = declarative_base()
+
+class LegacyInstructor(LegacyBase):
+    __tablename__ = "instructors"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    bio = Column(String(255), nullable=True)
+    skills = Column(String(255), nullable=True)
+
+def seed(engine, rows):
+    Base.metadata.create_all(engine, tables=[Instructor.__table__])
+    skills = json.dumps(["python", "sql", "teaching", "react"])
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Instructor.__table__),
+            [{"name": f"instructor {i}", "bio": "bio", "skills": skills} for i in range(rows)],
+        )
+
+# Best of a few runs, to keep GC pauses and machine noise out of the numbers
+def timed(label, rows, func, repeat=5):
+    elapsed = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms total {elapsed / rows * 1e6:8.2f} us/row")
+    return elapsed
+
+def load_raw(engine):
+    with Session(engine) as session:
+        session.scalars(select(LegacyInstructor)).all()
+
+def load_legacy(engine):
+    with Session(engine) as session:
+        for instructor in session.scalars(select(LegacyInstructor)).all():
+            if isinstance(instructor.skills, str):
+                try:
+                    instructor.skills = json.loads(instructor.skills)
+                except json.JSONDecodeError:
+                    instructor.skills = []
+        assert len(session.dirty) == len(session.identity_map)  # Every row was written back
+
+def load_codec(engine):
+    with Session(engine) as session:
+        instructors = session.scalars(select(Instructor)).all()
+        assert isinstance(instructors[0].skills, list) and not session.dirty
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    engine = create_engine("sqlite://")
+    seed(engine, rows)
+    load_raw(engine)  # Warm up
+
+    raw = timed("load only (no decoding)", rows, lambda: load_raw(engine))
+    legacy = timed("json.loads loop (before)", rows, lambda: load_legacy(engine))
+    codec = timed("JSONList column (after)", rows, lambda: load_codec(engine))
+    print(f"decode overhead per row: before {(legacy - raw) / rows * 1e6:.2f} us, after {(codec - raw) / rows * 1e6:.2f} us")
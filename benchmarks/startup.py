@@ -0,0 +1,84 @@
+# Import time and cold start of the API, each measured in a fresh process.
+#
+# "import" is how long `import <module>` takes. "startup" runs main.app's
+# lifespan against a throwaway SQLite file (Mongo is the in-memory stand-in
+# from benchmarks.api) and times the lifespan and the first request after it.
+#
+#     python -m benchmarks.startup [runs]
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import asyncio, json, httpx
+import auth
+from benchmarks.api import MemoryMongo
+auth.AsyncIOMotorClient = lambda *args, **kwargs: MemoryMongo()
+from main import app
+imported = time.perf_counter()
+
+async def run():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://startup") as client:
+            response = await client.get("/students/", params={"limit": 1})
+        served = time.perf_counter()
+    print(json.dumps({
+        "import": imported - start,
+        "lifespan": ready - imported,
+        "first_request": served - ready,
+        "total": served - start,
+        "status": response.status_code,
+    }))
+
+asyncio.run(run())
+"""
+
+def run_child(script, env):
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result.stdout.strip().splitlines()[-1]
+
+def describe(values):
+    return f"best {min(values) * 1000:7.1f} ms   median {statistics.median(values) * 1000:7.1f} ms"
+
+# Create the tables up front, through the same migration a deployment runs,
+# so the first request has something to read
+def create_schema(env):
+    subprocess.run([sys.executable, "-m", "migrations.create_schema"], cwd=ROOT, env=env, check=True, capture_output=True)
+
+def main(runs):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "startup.db")
+        env = {**os.environ, "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{path}"}
+        create_schema(env)
+
+        for module in ("models.database", "auth", "main"):
+            try:
+                times = [float(run_child(IMPORT_SCRIPT.format(module=module), env)) for _ in range(runs)]
+                print(f"import {module:<16} {describe(times)}")
+            except RuntimeError as error:
+                print(f"import {module:<16} failed: {error}")
+
+        samples = [json.loads(run_child(STARTUP_SCRIPT, env)) for _ in range(runs)]
+        for key in ("import", "lifespan", "first_request", "total"):
+            print(f"startup {key:<15} {describe([sample[key] for sample in samples])}")
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
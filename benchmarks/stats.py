@@ -0,0 +1,128 @@
+# Cost of the /stats snapshots at scale: the full rebuild (what startup and
+# STATS_REFRESH_SECONDS pay), each incremental update the routers make, and
+# computing the summaries the endpoints serve.
+#
+# Runs against a seeded SQLite file (1M students by default; reused between
+# runs) and prints a table, optionally saved as JSON.
+#
+#     python -m benchmarks.stats --students 1000000 --runs 3 --output stats_results.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+from benchmarks.api import DEFAULT_DB_DIR, SEED_VERSION, RSSSampler, seed_database
+
+UPDATES = 20_000
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+# Mean seconds per call of `step(i)` over `count` calls
+def per_call(step, count):
+    start = time.perf_counter()
+    for i in range(count):
+        step(i)
+    return (time.perf_counter() - start) / count
+
+async def run(args):
+    from models.database import dispose_engine, init_engine
+    from stats import build_stats, forget_rows, record_rows, stats
+
+    instructors = args.instructors or max(args.students // 200, 1)
+    workshops = args.workshops or max(args.students // 20, 1)
+    db_path = os.path.join(args.db_dir, f"stats_{args.students}_{instructors}_{workshops}_v{SEED_VERSION}.db")
+    print(f"seeding {db_path} (first run only)")
+    seed_database(db_path, args.students, instructors, workshops)
+    await init_engine(f"sqlite+aiosqlite:///{db_path}", warm=0)
+
+    results = {"students": args.students, "instructors": instructors, "workshops": workshops}
+
+    # Full rebuild, as at startup
+    builds, peaks = [], []
+    for _ in range(args.runs):
+        sampler = RSSSampler()
+        before = sampler.current()
+        sampling = asyncio.create_task(sampler.run())
+        start = time.perf_counter()
+        await build_stats()
+        builds.append(time.perf_counter() - start)
+        sampling.cancel()
+        peaks.append(sampler.peak - before)
+    results["build_seconds"] = statistics.median(builds)
+    results["build_rss_mb"] = sampler.current() / 1e6
+    results["build_peak_growth_mb"] = max(peaks) / 1e6
+
+    # Incremental updates, as the routers make them
+    rng = random.Random(7)
+    reasons = ["career change", "curiosity", "promotion", "side project", "community", "new reason"]
+    skills = ["python", "sql", "react", "teaching", "rust"]
+    student_rows = [
+        SimpleNamespace(id=rng.randint(1, args.students), reasons=rng.sample(reasons, 2)) for _ in range(UPDATES)
+    ]
+    instructor_rows = [SimpleNamespace(id=rng.randint(1, instructors), skills=rng.sample(skills, 3)) for _ in range(UPDATES)]
+    workshop_rows = [
+        SimpleNamespace(
+            id=rng.randint(1, workshops),
+            instructors=[str(rng.randint(1, instructors))],
+            students=[str(rng.randint(1, args.students)) for _ in range(5)],
+        )
+        for _ in range(UPDATES)
+    ]
+    results["update_student_us"] = per_call(lambda i: record_rows("students", [student_rows[i]]), UPDATES) * 1e6
+    results["update_instructor_us"] = per_call(lambda i: record_rows("instructors", [instructor_rows[i]]), UPDATES) * 1e6
+    results["update_workshop_us"] = per_call(lambda i: record_rows("workshops", [workshop_rows[i]]), UPDATES) * 1e6
+    places = [rng.randint(1, workshops) for _ in range(UPDATES)]
+    results["delete_student_us"] = per_call(lambda i: forget_rows("students", [student_rows[i].id], [places[i]]), UPDATES) * 1e6
+
+    # Summaries: first read after a write (computed) and repeat reads (cached)
+    for name, summary in (
+        ("skills", stats.skill_counts),
+        ("reasons", stats.reason_counts),
+        ("workshops", stats.workshop_sizes),
+        ("instructors", stats.instructor_load),
+    ):
+        stats.changed()
+        results[f"{name}_cold_ms"] = timed(summary, 20)[0] * 1000
+        results[f"{name}_cached_us"] = per_call(lambda i: summary(20), 1000) * 1e6
+
+    await dispose_engine()
+    return results
+
+def report(results):
+    print(f"{results['students']:,} students, {results['instructors']:,} instructors, {results['workshops']:,} workshops")
+    print(
+        f"  full rebuild            {results['build_seconds']:8.2f} s    "
+        f"RSS {results['build_rss_mb']:.0f} MB (peak +{results['build_peak_growth_mb']:.0f} MB while building)"
+    )
+    for key in ("update_student_us", "update_instructor_us", "update_workshop_us", "delete_student_us"):
+        print(f"  {key[:-3].replace('_', ' '):<23} {results[key]:8.1f} us")
+    for name in ("skills", "reasons", "workshops", "instructors"):
+        print(f"  /stats/{name:<16} {results[f'{name}_cold_ms']:8.2f} ms after a write, {results[f'{name}_cached_us']:6.1f} us cached")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=1_000_000)
+    parser.add_argument("--instructors", type=int, help="Defaults to students / 200")
+    parser.add_argument("--workshops", type=int, help="Defaults to students / 20")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Also write the results here as JSON")
+    parser.add_argument("--db-dir", default=DEFAULT_DB_DIR)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
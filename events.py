@@ -0,0 +1,146 @@
+from collections import deque
+from dotenv import load_dotenv
+import asyncio
+import orjson
+import os
+
+# Load environment variables
+load_dotenv()
+
+# Change feed for the frontend: the routers publish a small event for every
+# create, update and delete ({"entity", "action", "ids"}) and GET /events
+# streams them to subscribers, so clients refetch just the rows that changed
+# instead of polling the lists.
+#
+# The default broker lives in this process and only sees its own writes.
+# Setting EVENTS_REDIS_URL keeps the feed in a Redis stream instead, so every
+# uvicorn worker publishes to and reads from the same one.
+EVENTS_ENABLED = os.getenv("EVENTS_ENABLED", "true").lower() == "true"
+EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL")
+
+# Events kept for clients resuming with Last-Event-ID; anyone further behind gets a reset
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", "10000"))
+
+# Events buffered per subscriber. A client that falls this far behind is
+# disconnected; it reconnects with Last-Event-ID and catches up from the history.
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+
+# How often an idle stream sends a keepalive comment
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+
+EVENT_ENTITIES = ("students", "instructors", "workshops")
+
+# Yielded by subscribe() when the events since the client's last id are no
+# longer available: the client should refetch what it shows
+RESET = object()
+
+# Yielded by subscribe() after EVENT_KEEPALIVE_SECONDS without events
+IDLE = object()
+
+class Subscription:
+    def __init__(self, size):
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+# Events fanned out to this process's subscribers, with ids counting up from 1
+class LocalBroker:
+    def __init__(self, history, queue_size):
+        self.history = deque(maxlen=history)  # (id, event)
+        self.queue_size = queue_size
+        self.last_id = 0
+        self.subscribers = set()
+
+    async def publish(self, event):
+        self.last_id += 1
+        item = (str(self.last_id), event)
+        self.history.append(item)
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Too slow: stop feeding it and let it catch up from the history after reconnecting
+                subscription.overflowed = True
+                self.subscribers.discard(subscription)
+
+    # The events after last_id, or None if some of them have been dropped
+    def since(self, last_id):
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            return None
+        if last_id > self.last_id:
+            return None
+        oldest = int(self.history[0][0]) if self.history else self.last_id + 1
+        if last_id < oldest - 1:
+            return None
+        return [item for item in self.history if int(item[0]) > last_id]
+
+    async def subscribe(self, last_id=None):
+        subscription = Subscription(self.queue_size)
+        self.subscribers.add(subscription)  # Before reading the history, so nothing falls in between
+        try:
+            if last_id is not None:
+                backlog = self.since(last_id)
+                if backlog is None:
+                    yield RESET, None
+                    backlog = []
+                for item in backlog:
+                    yield item
+            while not (subscription.overflowed and subscription.queue.empty()):
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield IDLE, None
+        finally:
+            self.subscribers.discard(subscription)
+
+# Events in a Redis stream shared by every worker. Readers pull at their own
+# pace, so a slow client only holds its own cursor.
+class RedisBroker:
+    def __init__(self, url, history, stream="events"):
+        import redis.asyncio as redis  # Only needed when a shared broker is configured
+
+        self.redis = redis.from_url(url)
+        self.history = history
+        self.stream = stream
+
+    async def publish(self, event):
+        await self.redis.xadd(self.stream, {"event": orjson.dumps(event)}, maxlen=self.history, approximate=True)
+
+    async def subscribe(self, last_id=None):
+        cursor = "$"
+        if last_id is not None:
+            # Trimmed past the client's last event: what came after it may be gone
+            oldest = await self.redis.xrange(self.stream, count=1)
+            try:
+                cursor = stream_id(last_id)
+            except ValueError:
+                cursor = None
+            if cursor is None or (oldest and stream_id(oldest[0][0]) > cursor):
+                yield RESET, None
+                cursor = "$"
+            else:
+                cursor = last_id
+        while True:
+            response = await self.redis.xread({self.stream: cursor}, block=int(EVENT_KEEPALIVE_SECONDS * 1000), count=100)
+            if not response:
+                yield IDLE, None
+                continue
+            for entry_id, fields in response[0][1]:
+                cursor = entry_id
+                yield entry_id.decode(), orjson.loads(fields[b"event"])
+
+# Redis stream ids ("1700000000000-0") as comparable tuples
+def stream_id(value):
+    if isinstance(value, bytes):
+        value = value.decode()
+    milliseconds, _, sequence = value.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+broker = RedisBroker(EVENTS_REDIS_URL, EVENT_HISTORY) if EVENTS_REDIS_URL else LocalBroker(EVENT_HISTORY, EVENT_QUEUE_SIZE)
+
+# Announce rows the routers have just written ("created", "updated" or "deleted")
+async def publish(entity, action, ids):
+    ids = list(ids)
+    if EVENTS_ENABLED and ids:
+        await broker.publish({"entity": entity, "action": action, "ids": ids})
@@ -0,0 +1,155 @@
+from dotenv import load_dotenv
+from cache import TTLCache
+from metrics import idempotent_requests
+import asyncio
+import hashlib
+import orjson
+import os
+
+# Load environment variables
+load_dotenv()
+
+# POST and PATCH requests sent with an Idempotency-Key header run once: the
+# response is kept under the key (with the method and path) and replayed
+# to retries, so a frontend can resend a create after a timeout without
+# inserting it twice. A retry that arrives while the first attempt is still
+# running waits for it. Keys are scoped to the caller (its Authorization
+# header, or its address without one), so two clients that happen to send
+# the same key never see each other's responses. Keys live in a bounded,
+# expiring store in each worker's memory, so with several uvicorn workers
+# retries should reach the same one (e.g. sticky sessions).
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(64 * 1024)))
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENT_METHODS = {"POST", "PATCH"}
+MAX_KEY_LENGTH = 255
+
+# A request being handled: retries with its key wait on `done`
+class Pending:
+    def __init__(self):
+        self.done = asyncio.Event()
+
+# What a finished request sent. `body` is None when the response was too
+# big to keep; retries are then told it already ran instead.
+class Completed:
+    def __init__(self, fingerprint, status, headers, body):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+store = TTLCache(maxsize=IDEMPOTENCY_MAX_KEYS, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+def header(scope, name):
+    name = name.lower().encode()
+    return next((value for key, value in scope["headers"] if key == name), None)
+
+# Who sent a request: a hash of its credentials (so tokens aren't kept in
+# memory), or the client address for anonymous requests
+def caller(scope):
+    authorization = header(scope, "Authorization")
+    if authorization:
+        return "auth:" + hashlib.sha256(authorization).hexdigest()
+    client = scope.get("client")
+    return f"addr:{client[0]}" if client else "addr:"
+
+async def send_json(send, status, content, headers=()):
+    body = orjson.dumps(content)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        key = header(scope, IDEMPOTENCY_KEY_HEADER) if scope["type"] == "http" else None
+        if not IDEMPOTENCY_ENABLED or key is None or scope["method"] not in IDEMPOTENT_METHODS:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await send_json(send, 400, {"detail": f"{IDEMPOTENCY_KEY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters"})
+
+        store_key = (scope["method"], scope["path"], caller(scope), key)
+        while True:
+            entry = store.get(store_key)
+            if entry is None:
+                return await self.first_attempt(scope, receive, send, store_key)
+            if isinstance(entry, Completed):
+                return await self.replay(receive, send, entry)
+            idempotent_requests.inc("waited")
+            await entry.done.wait()  # Then replay it, or run if it failed
+
+    # Run the request, passing the response through while keeping a copy
+    async def first_attempt(self, scope, receive, send, store_key):
+        pending = Pending()
+        store.set(store_key, pending)
+        digest = hashlib.sha256()
+        body_done = False
+        response = {"status": None, "headers": [], "chunks": [], "size": 0}
+
+        async def hashing_receive():
+            nonlocal body_done
+            message = await receive()
+            if message["type"] == "http.request":
+                digest.update(message.get("body", b""))
+                body_done = not message.get("more_body", False)
+            return message
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and response["size"] <= IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                response["chunks"].append(message.get("body", b""))
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        completed = None
+        try:
+            await self.app(scope, hashing_receive, recording_send)
+            while not body_done:  # Hash what the handler didn't read, to compare retries by
+                message = await receive()
+                if message["type"] != "http.request":
+                    break
+                digest.update(message.get("body", b""))
+                body_done = not message.get("more_body", False)
+            # Server errors aren't kept, so a retry runs the request again
+            if response["status"] is not None and response["status"] < 500:
+                body = b"".join(response["chunks"]) if response["size"] <= IDEMPOTENCY_MAX_RESPONSE_BYTES else None
+                completed = Completed(digest.hexdigest(), response["status"], response["headers"], body)
+        finally:
+            if completed is not None:
+                store.set(store_key, completed)
+            else:
+                store.pop(store_key)
+            pending.done.set()
+
+    # Answer a retry from the kept response, if it's the same request
+    async def replay(self, receive, send, entry):
+        digest = hashlib.sha256()
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            digest.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        if digest.hexdigest() != entry.fingerprint:
+            idempotent_requests.inc("mismatched")
+            return await send_json(send, 422, {"detail": f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request"})
+        if entry.body is None:
+            idempotent_requests.inc("replayed")
+            return await send_json(send, 409, {"detail": "This request already ran; its response was too large to keep"})
+        idempotent_requests.inc("replayed")
+        headers = [*entry.headers, (REPLAYED_HEADER.lower().encode(), b"true")]
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
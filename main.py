@@ -1,11 +1,72 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from auth import router as auth_router
+from auth import router as auth_router, init_mongo, close_mongo
 from routes.students import router as students_router
 from routes.instructors import router as instructors_router
 from routes.workshops import router as workshops_router
+from routes.search import router as search_router
+from routes.transfer import router as transfer_router
+from routes.pictures import router as pictures_router
+from routes.events import router as events_router
+from routes.stats import router as stats_router
+from models.database import (
+    DB_REPLICA_CHECK_SECONDS, DatabaseRoutingMiddleware, check_replicas, dispose_engine, init_engine, replicas,
+)
+from passwords import shutdown_password_pool
+from pictures import init_pictures, shutdown_picture_pool
+from routes.pagination import NEXT_CURSOR_HEADER
+from response_cache import ResponseCacheMiddleware
+from idempotency import REPLAYED_HEADER, IdempotencyMiddleware
+from metrics import MetricsMiddleware, router as metrics_router
+from search import SEARCH_INDEX_REFRESH_SECONDS, build_search_index, refresh_search_index
+from stats import STATS_REFRESH_SECONDS, build_stats, refresh_stats
+from matching import SKILL_INDEX_REFRESH_SECONDS, build_skill_index, refresh_skill_index
+import asyncio
+
+# Connect to MySQL (warming the pools, replicas included) and Mongo, build
+# the search and skill indexes and dashboard stats and load the thumbnail
+# cache on startup; release pools and workers on shutdown.
+# Tables are created by `python -m migrations.create_schema`.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_engine()
+    await init_mongo()
+    await build_search_index()
+    await build_stats()
+    await build_skill_index()
+    init_pictures()
+    refreshes = [
+        asyncio.create_task(refresh())
+        for refresh, seconds in (
+            (refresh_search_index, SEARCH_INDEX_REFRESH_SECONDS),
+            (refresh_stats, STATS_REFRESH_SECONDS),
+            (refresh_skill_index, SKILL_INDEX_REFRESH_SECONDS),
+            (check_replicas, DB_REPLICA_CHECK_SECONDS if replicas else 0),
+        )
+        if seconds
+    ]
+    yield
+    for refresh in refreshes:
+        refresh.cancel()
+    await dispose_engine()
+    close_mongo()
+    shutdown_password_pool()
+    shutdown_picture_pool()
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# Cache GET responses with ETags. Added first, so every middleware below wraps
+# it: CORS headers reach cached replies too, and the routing middleware has
+# decided where a request reads from before the cache is consulted.
+app.add_middleware(ResponseCacheMiddleware)
+
+# Send reads to the replicas and writes (and the writer's next reads) to the
+# primary. It wraps the response cache, which checks how a request was routed.
+app.add_middleware(DatabaseRoutingMiddleware)
+
+# Replay the response to retried POST/PATCH requests sent with an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -14,10 +75,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", REPLAYED_HEADER],  # Let the frontend read the cursor, ETags and replays
 )
 
+# Time every request, cached or not (added last so it wraps everything else)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(students_router)
 app.include_router(instructors_router)
-app.include_router(workshops_router)
\ No newline at end of file
+app.include_router(workshops_router)
+app.include_router(search_router)
+app.include_router(transfer_router)
+app.include_router(pictures_router)
+app.include_router(events_router)
+app.include_router(stats_router)
+app.include_router(metrics_router)
\ No newline at end of file
@@ -0,0 +1,205 @@
+from collections import defaultdict
+from sqlalchemy import select
+from dotenv import load_dotenv
+from models.database import SessionLocal
+from models.instructors import Instructor
+from search import tokenize
+import asyncio
+import math
+import numpy as np
+import os
+
+# Load environment variables
+load_dotenv()
+
+# Ranks instructors for a workshop by how much of its subject and
+# description their skills cover. Instructors are grouped by their set of
+# skill words, and the sets form a boolean matrix (set x word), so a whole
+# term's workshops are scored against every set with one matrix product.
+# Built at startup (build_skill_index) and kept current by the instructors
+# router; SKILL_INDEX_REFRESH_SECONDS rebuilds it for multi-worker setups.
+SKILL_INDEX_ENABLED = os.getenv("SKILL_INDEX_ENABLED", "true").lower() == "true"
+SKILL_INDEX_REFRESH_SECONDS = float(os.getenv("SKILL_INDEX_REFRESH_SECONDS", "0"))
+
+# An instructor already teaching another workshop that day keeps this share of their score
+CONFLICT_PENALTY = float(os.getenv("MATCH_CONFLICT_PENALTY", "0.25"))
+
+# Words in the subject count this much more than words in the description
+SUBJECT_WEIGHT = 2.0
+
+# Workshops scored per matrix product in a batch
+SCORE_BLOCK_ROWS = 256
+
+# Make sure array[index] exists along `axis`, growing by doubling
+def grow(array, index, axis=0):
+    if index < array.shape[axis]:
+        return array
+    shape = list(array.shape)
+    shape[axis] = max(index + 1, shape[axis] * 2, 8)
+    grown = np.zeros(shape, dtype=array.dtype)
+    grown[tuple(slice(0, size) for size in array.shape)] = array
+    return grown
+
+class SkillIndex:
+    def __init__(self):
+        self.words = {}  # skill word -> column
+        self.sets = []  # set code -> tuple of words
+        self.set_codes = {}  # tuple of words -> set code
+        self.matrix = np.zeros((0, 0), dtype=bool)  # set code x column
+        self.members = []  # set code -> instructor ids with exactly those words
+        self.sorted_members = {}  # set code -> members in id order, rebuilt after a change
+        self.instructor_sets = {}  # instructor id -> set code
+        self.frequency = np.zeros(0, dtype=np.int64)  # column -> instructors with the word
+
+    def __len__(self):
+        return len(self.instructor_sets)
+
+    def replace(self, other):
+        self.__dict__.update(other.__dict__)
+
+    def column(self, word):
+        column = self.words.get(word)
+        if column is None:
+            column = self.words[word] = len(self.words)
+            self.matrix = grow(self.matrix, column, axis=1)
+            self.frequency = grow(self.frequency, column)
+        return column
+
+    def code(self, words):
+        code = self.set_codes.get(words)
+        if code is None:
+            code = self.set_codes[words] = len(self.sets)
+            self.sets.append(words)
+            self.members.append(set())
+            columns = [self.column(word) for word in words]  # May widen the matrix, so before indexing it
+            self.matrix = grow(self.matrix, code, axis=0)
+            self.matrix[code, columns] = True
+        return code
+
+    def update(self, instructor_id, skills):
+        self.remove(instructor_id)
+        words = tuple(sorted({word for skill in skills or [] for word in tokenize(str(skill))}))
+        if not words:
+            return
+        code = self.code(words)
+        self.members[code].add(instructor_id)
+        self.sorted_members.pop(code, None)
+        self.instructor_sets[instructor_id] = code
+        self.frequency[[self.words[word] for word in words]] += 1
+
+    def remove(self, instructor_id):
+        code = self.instructor_sets.pop(instructor_id, None)
+        if code is not None:
+            self.members[code].discard(instructor_id)
+            self.sorted_members.pop(code, None)
+            self.frequency[[self.words[word] for word in self.sets[code]]] -= 1
+
+    def members_of(self, code):
+        members = self.sorted_members.get(code)
+        if members is None:
+            members = self.sorted_members[code] = sorted(self.members[code])
+        return members
+
+    # Weight of each skill word in a workshop's text: where it appears, times
+    # how rare it is among instructors. Words no instructor has are dropped.
+    def query(self, subject, description):
+        weights = defaultdict(float)
+        for text, weight in ((subject, SUBJECT_WEIGHT), (description, 1.0)):
+            for word in tokenize(text or ""):
+                column = self.words.get(word)
+                if column is not None and self.frequency[column]:
+                    weights[column] += weight
+        total = len(self.instructor_sets)
+        return {column: weight * math.log(1 + total / self.frequency[column]) for column, weight in weights.items()}
+
+    # Rank instructors for each workshop. `workshops` holds (subject,
+    # description, assigned ids, busy ids): those already on the workshop are
+    # left out and those teaching elsewhere that day are penalized. Returns,
+    # per workshop, up to `limit` (instructor id, score, matched words,
+    # conflict), with scores from 0 to 1 (the share of the workshop's
+    # weighted words an instructor covers).
+    def suggest(self, workshops, limit):
+        queries = [self.query(subject, description) for subject, description, _, _ in workshops]
+        columns = sorted({column for query in queries for column in query})
+        if not columns or not self.sets:
+            return [[] for _ in workshops]
+        position = {column: i for i, column in enumerate(columns)}
+        weights = np.zeros((len(workshops), len(columns)), dtype=np.float32)
+        for row, query in enumerate(queries):
+            for column, weight in query.items():
+                weights[row, position[column]] = weight
+        totals = weights.sum(axis=1)
+        sets = self.matrix[:len(self.sets), columns].T.astype(np.float32)  # Only the words these workshops use
+        words = {column: word for word, column in self.words.items()}
+
+        ranked = []
+        for start in range(0, len(workshops), SCORE_BLOCK_ROWS):  # Keeps the workshops x sets block small
+            set_scores = weights[start:start + SCORE_BLOCK_ROWS] @ sets
+            for row, scores in enumerate(set_scores, start):
+                _, _, assigned, busy = workshops[row]
+                if not totals[row]:
+                    ranked.append([])
+                    continue
+                query_words = {words[column] for column in queries[row]}
+                ranked.append(self.rank(scores / totals[row], assigned, busy, limit, query_words))
+        return ranked
+
+    # Sets with a positive score, best first. Usually only the first few are
+    # needed, so those are picked out and sorted before the rest.
+    def ordered(self, scores, head):
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > head:
+            best = candidates[np.argpartition(-scores[candidates], head - 1)[:head]]
+            yield from best[np.argsort(-scores[best], kind="stable")].tolist()
+            candidates = np.setdiff1d(candidates, best, assume_unique=True)
+        yield from candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+    # Walk the sets best first. A set's score bounds its members' scores, so
+    # stop once it can't beat the current limit-th best.
+    def rank(self, scores, assigned, busy, limit, query_words):
+        ranked = []
+        for code in self.ordered(scores, 4 * limit + 16):
+            score = float(scores[code])
+            if len(ranked) >= limit and score <= ranked[limit - 1][1]:
+                break
+            members = [i for i in self.members_of(code) if i not in assigned]
+            if not members:
+                continue
+            matched = sorted(query_words.intersection(self.sets[code]))
+            # Members of a set score alike, so at most `limit` of each kind can make the cut
+            free = [i for i in members if i not in busy][:limit]
+            taken = [i for i in members if i in busy][:limit]
+            ranked.extend((i, score, matched, False) for i in free)
+            ranked.extend((i, score * CONFLICT_PENALTY, matched, True) for i in taken)
+            ranked.sort(key=lambda item: -item[1])
+            del ranked[limit:]
+        return ranked
+
+skill_index = SkillIndex()
+
+# Keep the index in step with instructors the router has just written
+def index_instructors(rows):
+    if SKILL_INDEX_ENABLED:
+        for row in rows:
+            skill_index.update(row.id, row.skills)
+
+def unindex_instructors(*ids):
+    if SKILL_INDEX_ENABLED:
+        for instructor_id in ids:
+            skill_index.remove(instructor_id)
+
+async def build_skill_index():
+    if not SKILL_INDEX_ENABLED:
+        return
+    index = SkillIndex()
+    async with SessionLocal() as db:
+        result = await db.stream(select(Instructor.id, Instructor.skills).execution_options(yield_per=5000))
+        async for instructor_id, skills in result:
+            index.update(instructor_id, skills)
+    skill_index.replace(index)
+
+# Rebuild every SKILL_INDEX_REFRESH_SECONDS, to pick up other workers' writes
+async def refresh_skill_index():
+    while True:
+        await asyncio.sleep(SKILL_INDEX_REFRESH_SECONDS)
+        await build_skill_index()
@@ -0,0 +1,235 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+from pymongo import monitoring
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
+from dotenv import load_dotenv
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+
+# Load environment variables
+load_dotenv()
+
+# Request latency, SQL queries, Mongo commands and password hashing, exposed
+# in the Prometheus text format at /metrics. Requests slower than
+# SLOW_REQUEST_MS are logged with a breakdown of the queries they ran
+# (0 turns the log off).
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_TOP_QUERIES = int(os.getenv("SLOW_REQUEST_TOP_QUERIES", "5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+# Mongo listeners run on motor's worker threads, so every update takes the lock
+lock = threading.Lock()
+registry = []
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with lock:
+            self.values[labels] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        registry.append(self)
+
+    def observe(self, *labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self):
+        for labels, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{format_labels(self.labels, labels, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {counts[-1]}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}"
+
+def render():
+    lines = []
+    with lock:
+        for metric in registry:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "Time to the response headers", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "Requests being handled")
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "SQL statements run per request", ("route",), buckets=COUNT_BUCKETS
+)
+db_query_duration = Histogram("db_query_duration_seconds", "SQL statement execution time")
+db_sessions = Counter(
+    "db_sessions_total", "Database sessions by where they went (primary or a replica) and why", ("target", "reason")
+)
+db_replica_up = Gauge("db_replica_up", "1 while a read replica is in rotation, 0 while ejected", ("replica",))
+db_replica_ejections = Counter("db_replica_ejections_total", "Times a read replica was taken out of rotation", ("replica",))
+mongo_command_duration = Histogram("mongo_command_duration_seconds", "Mongo command round trips", ("command",))
+mongo_command_failures = Counter("mongo_command_failures_total", "Mongo commands that failed", ("command",))
+password_duration = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time, including the wait for a worker", ("operation",)
+)
+idempotent_requests = Counter(
+    "idempotent_requests_total", "Retries sent with a known Idempotency-Key, by what happened to them", ("outcome",)
+)
+password_rejections = Counter("password_pool_rejections_total", "Hash/verify calls turned away with a 503")
+
+# What the current request has spent so far, for the slow-request log
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}  # statement -> [count, seconds], only kept when the slow log is on
+        self.mongo_commands = 0
+        self.mongo_time = 0.0
+        self.password_time = 0.0
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+# Time every SQL statement on every engine. SQLAlchemy runs these hooks in
+# the awaiting task's context, so they see the request they belong to.
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._metrics_start
+    db_query_duration.observe(value=seconds)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += seconds
+        if SLOW_REQUEST_MS:
+            entry = stats.statements.setdefault(statement, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+# Passed to the motor client; motor runs pymongo in the caller's context
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.record(event)
+
+    def failed(self, event):
+        mongo_command_failures.inc(event.command_name)
+        self.record(event)
+
+    def record(self, event):
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_duration.observe(event.command_name, value=seconds)
+        stats = current_request.get()
+        if stats is not None:
+            stats.mongo_commands += 1
+            stats.mongo_time += seconds
+
+def record_password_time(operation, seconds):
+    password_duration.observe(operation, value=seconds)
+    stats = current_request.get()
+    if stats is not None:
+        stats.password_time += seconds
+
+# The route template ("/students/{student_id}"), so ids don't become label values.
+# Responses served from the response cache never reach the router, so match here.
+def route_label(request: Request):
+    route = request.scope.get("route")
+    if route is None:
+        route = next((r for r in request.app.router.routes if r.matches(request.scope)[0] == Match.FULL), None)
+    return getattr(route, "path", "unmatched")
+
+def log_slow_request(request: Request, route, status, seconds, stats):
+    lines = [
+        f"Slow request: {request.method} {route} {status} in {seconds * 1000:.1f} ms "
+        f"(db: {stats.queries} queries, {stats.db_time * 1000:.1f} ms; "
+        f"mongo: {stats.mongo_commands} commands, {stats.mongo_time * 1000:.1f} ms; "
+        f"passwords: {stats.password_time * 1000:.1f} ms)"
+    ]
+    slowest = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)
+    for statement, (count, total) in slowest[:SLOW_REQUEST_TOP_QUERIES]:
+        lines.append(f"  {count}x {total * 1000:.1f} ms  {' '.join(statement.split())[:200]}")
+    logger.warning("\n".join(lines))
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        http_in_flight.inc()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            seconds = time.perf_counter() - start
+            http_in_flight.dec()
+            current_request.reset(token)
+            route = route_label(request)
+            http_requests.inc(request.method, route, str(status))
+            http_duration.observe(request.method, route, value=seconds)
+            db_queries_per_request.observe(route, value=stats.queries)
+            if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+                log_slow_request(request, route, status, seconds, stats)
+
+# Initialize the router
+router = APIRouter()
+
+# GET endpoint for Prometheus to scrape
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
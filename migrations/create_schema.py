@@ -0,0 +1,27 @@
+# Create any missing tables. The app no longer does this on startup; run it
+# once per database (and before the other migrations) instead:
+#
+#     python -m migrations.create_schema
+from sqlalchemy import inspect
+import asyncio
+import logging
+
+from models.base import Base
+from models.database import dispose_engine, init_engine
+
+def create_tables(conn):
+    existing = set(inspect(conn).get_table_names())
+    Base.metadata.create_all(conn)
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            logging.info(f"Created table {table.name}")
+
+async def main():
+    engine = await init_engine(warm=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(create_tables)
+    await dispose_engine()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
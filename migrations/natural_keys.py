@@ -0,0 +1,59 @@
+# Add the unique indexes on the natural keys: students.name,
+# instructors.name and workshops(subject, date).
+#
+#     python -m migrations.natural_keys
+#
+# An index is only created once its table has no duplicates; any found are
+# listed so they can be merged or renamed first, and the migration re-run.
+from sqlalchemy import func, inspect, select
+import asyncio
+import logging
+import sys
+
+from models.database import dispose_engine, init_engine
+from models.instructors import Instructor
+from models.students import Student
+from models.workshops import Workshop
+
+NATURAL_KEYS = {
+    Student: ["ix_students_name"],
+    Instructor: ["ix_instructors_name"],
+    Workshop: ["ix_workshops_subject_date"],
+}
+
+# Duplicates shown per index when it can't be created
+MAX_REPORTED = 20
+
+def upgrade(conn):
+    blocked = 0
+    for model, index_names in NATURAL_KEYS.items():
+        table = model.__table__
+        existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in index_names or index.name in existing:
+                continue
+            columns = list(index.columns)
+            duplicates = conn.execute(
+                select(*columns, func.count()).group_by(*columns).having(func.count() > 1).limit(MAX_REPORTED)
+            ).all()
+            if duplicates:
+                blocked += 1
+                logging.error(f"Not creating {index.name}: {table.name} has duplicate {', '.join(c.name for c in columns)}")
+                for *values, count in duplicates:
+                    logging.error(f"  {count}x {tuple(values)}")
+                continue
+            index.create(conn)
+            logging.info(f"Created {index.name}")
+    return blocked
+
+async def main():
+    engine = await init_engine(warm=0)
+    async with engine.begin() as conn:
+        blocked = await conn.run_sync(upgrade)
+    await dispose_engine()
+    if blocked:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
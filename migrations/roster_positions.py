@@ -0,0 +1,54 @@
+# Add the position column to workshop_instructors and workshop_students, so
+# rosters come back in the order they were sent.
+#
+#     python -m migrations.roster_positions
+#
+# Existing links are numbered from the legacy workshops.instructors /
+# workshops.students JSON blobs where those are still around; links without
+# one keep position 0 and are listed by id, as before.
+from sqlalchemy import bindparam, inspect, text, update
+import asyncio
+import logging
+
+from migrations.workshop_rosters import LEGACY_ROSTERS, parse_ids
+from models.database import dispose_engine, init_engine
+
+BATCH_SIZE = 1000
+
+def upgrade(conn):
+    for column, (model, key, _) in LEGACY_ROSTERS.items():
+        table = model.__table__
+        if "position" in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+            logging.info(f"{table.name}.position already exists")
+            continue
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN position INTEGER NOT NULL DEFAULT 0"))
+        logging.info(f"Added {table.name}.position")
+
+        if column not in {c["name"] for c in inspect(conn).get_columns("workshops")}:
+            continue
+        statement = (
+            update(table)
+            .where(table.c.workshop_id == bindparam("w_id"), table.c[key] == bindparam("m_id"))
+            .values(position=bindparam("pos"))
+        )
+        batch, numbered = [], 0
+        for workshop_id, blob in conn.execute(text(f"SELECT id, {column} FROM workshops WHERE {column} IS NOT NULL")):
+            batch.extend({"w_id": workshop_id, "m_id": entry_id, "pos": position} for position, entry_id in enumerate(parse_ids(blob)))
+            if len(batch) >= BATCH_SIZE:
+                conn.execute(statement, batch)
+                numbered += len(batch)
+                batch = []
+        if batch:
+            conn.execute(statement, batch)
+            numbered += len(batch)
+        logging.info(f"{table.name}: numbered from workshops.{column} ({numbered} entries)")
+
+async def main():
+    engine = await init_engine(warm=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    await dispose_engine()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
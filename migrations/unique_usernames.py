@@ -0,0 +1,47 @@
+# Add the unique index on users.username in the auth Mongo database.
+#
+#     python -m migrations.unique_usernames
+#
+# Sign-ups used to check for the name and then insert, so older databases
+# can hold the same username twice. The index is only created once there
+# are none; any found are listed so they can be merged or renamed first,
+# and the migration re-run.
+import asyncio
+import logging
+import sys
+
+import auth
+
+# Duplicates shown when the index can't be created
+MAX_REPORTED = 20
+
+async def upgrade(users):
+    if "username_1" in await users.index_information():
+        logging.info("users.username index already exists")
+        return 0
+    duplicates = await users.aggregate([
+        {"$group": {"_id": "$username", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": MAX_REPORTED},
+    ]).to_list(None)
+    if duplicates:
+        logging.error("Not creating the users.username index: usernames are duplicated")
+        for duplicate in duplicates:
+            logging.error(f"  {duplicate['count']}x {duplicate['_id']!r}")
+        return 1
+    await users.create_index("username", unique=True)
+    logging.info("Created the users.username index")
+    return 0
+
+async def main():
+    await auth.init_mongo()
+    try:
+        blocked = await upgrade(auth.users_collection)
+    finally:
+        auth.close_mongo()
+    if blocked:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
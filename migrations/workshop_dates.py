@@ -0,0 +1,75 @@
+# Turn workshops.date from preformatted strings into an indexed DATETIME.
+#
+#     python -m migrations.workshop_dates
+#
+# Every value is parsed the way WorkshopCreate parses it into a new column.
+# If any row can't be parsed the migration lists them and stops before
+# touching the old column; fix those rows and run it again. Once everything
+# parses, the old column is dropped, the new one takes its name and
+# ix_workshops_date is created.
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, bindparam, inspect, text
+import asyncio
+import logging
+
+from models.database import dispose_engine, init_engine
+from schemas.workshops import parse_workshop_date
+
+BATCH_SIZE = 1000
+NEW_COLUMN = "date_parsed"
+
+# Just enough of the table to write the new column through SQLAlchemy's DateTime type
+workshops = Table(
+    "workshops", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column(NEW_COLUMN, DateTime),
+)
+
+def upgrade(conn):
+    columns = {column["name"]: column for column in inspect(conn).get_columns("workshops")}
+    if isinstance(columns["date"]["type"], DateTime) and NEW_COLUMN not in columns:
+        logging.info("workshops.date is already a datetime")
+    else:
+        if NEW_COLUMN not in columns:
+            conn.execute(text(f"ALTER TABLE workshops ADD COLUMN {NEW_COLUMN} DATETIME NULL"))
+
+        rows = conn.execute(text("SELECT id, date FROM workshops")).all()
+        updates, failures = [], []
+        for workshop_id, value in rows:
+            try:
+                parsed = parse_workshop_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                failures.append((workshop_id, value))
+            else:
+                updates.append({"_id": workshop_id, "parsed": parsed})
+
+        if failures:
+            for workshop_id, value in failures:
+                logging.error(f"workshop {workshop_id}: can't parse date {value!r}")
+            raise SystemExit(f"{len(failures)} workshop dates couldn't be parsed; fix them and re-run")
+
+        statement = workshops.update().where(workshops.c.id == bindparam("_id")).values({NEW_COLUMN: bindparam("parsed")})
+        for start in range(0, len(updates), BATCH_SIZE):
+            conn.execute(statement, updates[start:start + BATCH_SIZE])
+        logging.info(f"workshops.date: {len(updates)} dates parsed")
+
+        conn.execute(text("ALTER TABLE workshops DROP COLUMN date"))
+        conn.execute(text(f"ALTER TABLE workshops RENAME COLUMN {NEW_COLUMN} TO date"))
+        if conn.dialect.name == "mysql":  # SQLite can't add NOT NULL to an existing column
+            conn.execute(text("ALTER TABLE workshops MODIFY date DATETIME NOT NULL"))
+
+    indexes = {index["name"] for index in inspect(conn).get_indexes("workshops")}
+    if "ix_workshops_date" not in indexes:
+        conn.execute(text("CREATE INDEX ix_workshops_date ON workshops (date)"))
+        logging.info("Created index ix_workshops_date")
+
+async def main():
+    engine = await init_engine(warm=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    await dispose_engine()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
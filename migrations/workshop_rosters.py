@@ -0,0 +1,79 @@
+# Move the legacy workshops.instructors / workshops.students JSON blobs into
+# the workshop_instructors and workshop_students association tables.
+#
+#     python -m migrations.workshop_rosters
+#
+# The old columns are left in place (and no longer read) so the migration
+# can be re-run safely; drop them once the data has been checked. Link
+# tables created before rosters kept their order need
+# `python -m migrations.roster_positions` first.
+from sqlalchemy import inspect, select, text
+import asyncio
+import json
+import logging
+
+from models.database import dispose_engine, init_engine
+from models.instructors import Instructor
+from models.students import Student
+from models.workshops import WorkshopInstructor, WorkshopStudent
+
+BATCH_SIZE = 1000
+
+# legacy column -> (association model, foreign key column, referenced model)
+LEGACY_ROSTERS = {
+    "instructors": (WorkshopInstructor, "instructor_id", Instructor),
+    "students": (WorkshopStudent, "student_id", Student),
+}
+
+# Parse a roster blob into integer ids, skipping anything that isn't one
+def parse_ids(blob):
+    try:
+        entries = json.loads(blob)
+    except (TypeError, json.JSONDecodeError):
+        return []
+    if not isinstance(entries, list):
+        return []
+    return [int(entry) for entry in entries if str(entry).strip().isdigit()]
+
+def upgrade(conn):
+    for model, _, _ in LEGACY_ROSTERS.values():
+        model.__table__.create(conn, checkfirst=True)
+
+    columns = {column["name"] for column in inspect(conn).get_columns("workshops")}
+    for column, (model, key, target) in LEGACY_ROSTERS.items():
+        if column not in columns:
+            logging.info(f"workshops.{column} not found, nothing to migrate")
+            continue
+
+        known_ids = set(conn.scalars(select(target.id)))
+        linked = set(conn.execute(select(model.workshop_id, getattr(model, key))).tuples())
+        rows = conn.execute(text(f"SELECT id, {column} FROM workshops WHERE {column} IS NOT NULL"))
+
+        batch, inserted, skipped = [], 0, 0
+        for workshop_id, blob in rows:
+            for position, entry_id in enumerate(parse_ids(blob)):
+                if entry_id not in known_ids:
+                    skipped += 1
+                    continue
+                if (workshop_id, entry_id) in linked:
+                    continue
+                linked.add((workshop_id, entry_id))
+                batch.append({"workshop_id": workshop_id, key: entry_id, "position": position})
+            if len(batch) >= BATCH_SIZE:
+                conn.execute(model.__table__.insert(), batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            conn.execute(model.__table__.insert(), batch)
+            inserted += len(batch)
+        logging.info(f"workshops.{column}: {inserted} links created, {skipped} unknown ids skipped")
+
+async def main():
+    engine = await init_engine(warm=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    await dispose_engine()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,4 @@
+from sqlalchemy.orm import declarative_base
+
+# Shared declarative base, so every model lands in one MetaData
+Base = declarative_base()
@@ -1,8 +1,15 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from metrics import db_replica_ejections, db_replica_up, db_sessions
+import asyncio
+import contextvars
+import itertools
+import logging
 import os
+import time
 
 # Load environment variables
 load_dotenv()
@@ -13,25 +20,270 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 
-# SQLAlchemy database URL
-DATABASE_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}"
+# Connection pool settings (ignored by SQLite, which doesn't pool connections)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
-# SQLAlchemy setup
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+# SQLAlchemy database URL. ASYNC_DATABASE_URL overrides the MySQL settings,
+# e.g. "sqlite+aiosqlite:///./codebar.db" for local development.
+DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}",
+)
 
-# Import your models here
+# Read replicas, as a comma-separated list of URLs (ASYNC_DATABASE_REPLICA_URLS)
+# or of MySQL hosts sharing the primary's credentials (MYSQL_REPLICA_HOSTS).
+# With none configured every session goes to the primary.
+REPLICA_URLS = [url.strip() for url in os.getenv("ASYNC_DATABASE_REPLICA_URLS", "").split(",") if url.strip()] or [
+    f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{host.strip()}/{MYSQL_DATABASE}"
+    for host in os.getenv("MYSQL_REPLICA_HOSTS", "").split(",")
+    if host.strip()
+]
+
+# A replica that fails is left out for DB_REPLICA_EJECT_SECONDS, and every
+# DB_REPLICA_CHECK_SECONDS each one is probed with SELECT 1 (0 turns the probe off)
+DB_REPLICA_EJECT_SECONDS = float(os.getenv("DB_REPLICA_EJECT_SECONDS", "30"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "5"))
+DB_REPLICA_CHECK_TIMEOUT = float(os.getenv("DB_REPLICA_CHECK_TIMEOUT", "2"))
+
+# After a write, the client's reads go to the primary for this long (through
+# a cookie), so it sees its own writes despite replication lag. Clients
+# without cookies can send the header instead.
+DB_READ_YOUR_WRITES_SECONDS = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+READ_PRIMARY_COOKIE = "read_primary"
+READ_PRIMARY_HEADER = "x-read-primary"
+
+logger = logging.getLogger(__name__)
+
+# Pool keyword arguments for the async engine
+def engine_options(url):
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+# Connections opened (and checked) at startup, so the first requests don't
+# pay for the handshake. Capped at the pool size; SQLite has no pool to warm.
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", str(DB_POOL_SIZE)))
+
+# The engine is created by init_engine() from the app lifespan (or a CLI
+# tool), not at import, so importing the app never touches the database.
+# SessionLocal is bound to it then; it always means the primary.
+engine = None
+SessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# SQLite only enforces foreign keys (and their ON DELETE CASCADE) when asked to
+def enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def make_engine(url):
+    new_engine = create_async_engine(url, **engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(new_engine.sync_engine, "connect", enable_foreign_keys)
+    return new_engine
+
+# Open a few pooled connections concurrently and check them back in
+async def warm_pool(engine, count):
+    connections = await asyncio.gather(*(engine.connect() for _ in range(count)))
+    try:
+        await asyncio.gather(*(connection.execute(text("SELECT 1")) for connection in connections))
+    finally:
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+# Errors that say the server can't be reached, rather than that a statement was wrong
+def connection_failed(error):
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return isinstance(error, (OSError, TimeoutError))
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.ejected_until = 0.0  # time.monotonic(); 0 while healthy
+
+    def available(self, now):
+        return now >= self.ejected_until
+
+# Hands out replicas round-robin, skipping those ejected after a failure.
+# Once its ejection runs out a replica is tried again; the first session or
+# probe that succeeds on it brings it back for good.
+class ReplicaPool:
+    def __init__(self, replicas=()):
+        self.replicas = list(replicas)
+        self.turns = itertools.count()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def pick(self):
+        now = time.monotonic()
+        start = next(self.turns)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.available(now):
+                return replica
+        return None
+
+    def eject(self, replica, error):
+        if replica.ejected_until == 0.0:
+            logger.warning("Ejecting read replica %s: %s", replica.name, error)
+            db_replica_ejections.inc(replica.name)
+            db_replica_up.set(replica.name, value=0)
+        replica.ejected_until = time.monotonic() + DB_REPLICA_EJECT_SECONDS
+
+    def restore(self, replica):
+        if replica.ejected_until:
+            logger.warning("Read replica %s is back", replica.name)
+            replica.ejected_until = 0.0
+            db_replica_up.set(replica.name, value=1)
+
+    async def check(self, replica):
+        try:
+            async with asyncio.timeout(DB_REPLICA_CHECK_TIMEOUT):
+                async with replica.engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+        except Exception as error:
+            self.eject(replica, error)
+        else:
+            self.restore(replica)
+
+replicas = ReplicaPool()
+
+# Why the current request's sessions go where they do: "read" for reads a
+# replica may serve, "write" or "read_your_writes" for the primary. `replica`
+# names the replica a session actually read from, so the response cache
+# can tell replica reads apart.
+class Routing:
+    def __init__(self, route):
+        self.route = route
+        self.replica = None
+
+# Set per request by DatabaseRoutingMiddleware; None outside requests
+# (startup builds, CLI tools), which use the primary
+request_routing = contextvars.ContextVar("request_routing", default=None)
+
+async def init_engine(url=None, warm=None, replica_urls=None):
+    global engine
+    if replica_urls is None:
+        replica_urls = REPLICA_URLS if url is None else ()
+    url = url or DATABASE_URL
+    warm = min(DB_POOL_WARM if warm is None else warm, DB_POOL_SIZE)
+    engine = make_engine(url)
+    SessionLocal.configure(bind=engine)
+    replicas.replicas = [Replica(f"replica{i}", make_engine(replica_url)) for i, replica_url in enumerate(replica_urls)]
+    for replica in replicas.replicas:
+        db_replica_up.set(replica.name, value=1)
+    pools = [(engine, url), *zip((replica.engine for replica in replicas.replicas), replica_urls)]
+    await asyncio.gather(*(warm_pool(pool, warm) for pool, pool_url in pools if not pool_url.startswith("sqlite")))
+    return engine
+
+async def dispose_engine():
+    global engine
+    for replica in replicas.replicas:
+        await replica.engine.dispose()
+    replicas.replicas = []
+    if engine is not None:
+        await engine.dispose()
+        engine = None
+
+# Probe the replicas every DB_REPLICA_CHECK_SECONDS
+async def check_replicas():
+    while True:
+        await asyncio.sleep(DB_REPLICA_CHECK_SECONDS)
+        await asyncio.gather(*(replicas.check(replica) for replica in replicas.replicas))
+
+# A session for the current request: on the next healthy replica for reads,
+# otherwise (or with every replica ejected) on the primary. The replica's
+# connection is taken up front, so one that can't be reached is ejected and
+# the read moves on instead of failing; a later connection failure still
+# ejects it.
+@asynccontextmanager
+async def session():
+    routing = request_routing.get()
+    route = routing.route if routing else "background"
+    while route == "read" and (replica := replicas.pick()) is not None:
+        db = SessionLocal(bind=replica.engine)
+        try:
+            await db.connection()
+        except Exception as error:
+            await db.close()
+            if not connection_failed(error):
+                raise
+            replicas.eject(replica, error)
+            continue
+        db_sessions.inc(replica.name, route)
+        routing.replica = replica.name
+        async with db:
+            try:
+                yield db
+            except Exception as error:
+                if connection_failed(error):
+                    replicas.eject(replica, error)
+                raise
+        replicas.restore(replica)
+        return
+    db_sessions.inc("primary", "fallback" if route == "read" and replicas else route)
+    async with SessionLocal() as db:
+        yield db
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Whether a Cookie header holds a cookie of exactly this name
+def has_cookie(header, name):
+    name = name.encode()
+    return any(part.split(b"=", 1)[0].strip() == name for part in header.split(b";"))
+
+# Routes each request's sessions (see Routing): reads to the replicas
+# unless the client asked for the primary or wrote within the last
+# DB_READ_YOUR_WRITES_SECONDS; writes to the primary, and a successful
+# write sets the cookie that keeps the client's reads there for a while.
+class DatabaseRoutingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.cookie = (
+            f"{READ_PRIMARY_COOKIE}=1; Max-Age={DB_READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+        ).encode()
+
+    def route(self, scope):
+        if scope["method"] not in SAFE_METHODS:
+            return "write"
+        for name, value in scope["headers"]:
+            if name == READ_PRIMARY_HEADER.encode() or (name == b"cookie" and has_cookie(value, READ_PRIMARY_COOKIE)):
+                return "read_your_writes"
+        return "read"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = self.route(scope)
+        token = request_routing.set(Routing(route))
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400 and DB_READ_YOUR_WRITES_SECONDS:
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", self.cookie)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie if route == "write" and replicas else send)
+        finally:
+            request_routing.reset(token)
+
+# Import the models so they're registered on Base.metadata
 from models.instructors import Instructor
 from models.workshops import Workshop
 from models.students import Student
 
-Base.metadata.create_all(bind=engine)
-
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
+# Dependency to get the database session (one per request, routed by session())
+async def get_db():
+    async with session() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
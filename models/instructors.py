@@ -1,12 +1,11 @@
 from sqlalchemy import Column, String, Integer
-from sqlalchemy.ext.declarative import declarative_base
-
-Base = declarative_base()
+from models.base import Base
+from models.types import JSONList
 
 class Instructor(Base):
     __tablename__ = "instructors"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False)
+    name = Column(String(100), nullable=False, unique=True, index=True)  # Natural key
     bio = Column(String(255), nullable=True)  # Comma-separated
-    skills = Column(String(255), nullable=True)  # Comma-separated
\ No newline at end of file
+    skills = Column(JSONList(255), nullable=True)  # JSON list of strings
\ No newline at end of file
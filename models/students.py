@@ -1,12 +1,17 @@
-from sqlalchemy import Column, String, Integer, JSON 
-from sqlalchemy.ext.declarative import declarative_base
-
-Base = declarative_base()
+from sqlalchemy import Column, String, Integer
+from models.base import Base
+from models.types import JSONList
+from picture_urls import thumbnail_urls
 
 class Student(Base):
     __tablename__ = "students"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False)
-    reasons = Column(JSON(255), nullable=True)  # Comma-separated
-    picture = Column(String(255), nullable=True)  # Comma-separated
\ No newline at end of file
+    name = Column(String(100), nullable=False, unique=True, index=True)  # Natural key
+    reasons = Column(JSONList(255), nullable=True)  # JSON list of strings
+    picture = Column(String(255), nullable=True)  # Comma-separated
+
+    # Thumbnail URLs for an uploaded picture (see pictures.py)
+    @property
+    def thumbnails(self):
+        return thumbnail_urls(self.picture)
@@ -0,0 +1,30 @@
+from sqlalchemy.types import String, TypeDecorator
+import orjson
+
+# A list of strings stored as JSON text. Encoding and decoding happen once,
+# at the driver boundary, so handlers only ever see Python lists.
+class JSONList(TypeDecorator):
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, str):  # Already-encoded legacy values pass through
+            return value
+        return orjson.dumps(list(value)).decode()
+
+    def process_result_value(self, value, dialect):
+        return decode_list(value)
+
+# Decode a stored value, tolerating the legacy rows: values that were
+# JSON-encoded twice (reasons used to be dumped before hitting a JSON
+# column) and text that isn't JSON at all, which decodes to an empty list
+def decode_list(value):
+    if value is None or isinstance(value, list):
+        return value
+    try:
+        value = orjson.loads(value)
+        if isinstance(value, str):  # Double-encoded legacy row
+            value = orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return []
+    return value if isinstance(value, list) else []
@@ -1,17 +1,72 @@
-from sqlalchemy import Column, String, Integer, Text
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, DateTime, String, Integer, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from models.base import Base
 
-Base = declarative_base()
+# Association rows linking workshops to their instructors and students.
+# The composite primary key indexes the workshop side; the second column
+# gets its own index so "which workshops is X in" is a single lookup.
+# `position` keeps each roster in the order it was sent.
+class WorkshopInstructor(Base):
+    __tablename__ = "workshop_instructors"
+
+    workshop_id = Column(Integer, ForeignKey("workshops.id", ondelete="CASCADE"), primary_key=True)
+    instructor_id = Column(Integer, ForeignKey("instructors.id", ondelete="CASCADE"), primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0, server_default="0")
+
+class WorkshopStudent(Base):
+    __tablename__ = "workshop_students"
+
+    workshop_id = Column(Integer, ForeignKey("workshops.id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0, server_default="0")
+
+# Keep the links whose id is still listed, so re-saving a roster doesn't
+# delete and re-insert the same primary key, numbered in the order given
+def replace_links(links, ids, key, make_link):
+    existing = {getattr(link, key): link for link in links}
+    replaced = [existing.get(i) or make_link(i) for i in dict.fromkeys(int(i) for i in ids or [])]
+    for position, link in enumerate(replaced):
+        link.position = position
+    return replaced
 
 class Workshop(Base):
     __tablename__ = "workshops"
+    __table_args__ = (Index("ix_workshops_subject_date", "subject", "date", unique=True),)  # Natural key
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     subject = Column(String(100), nullable=False)
-    date = Column(String(100), nullable=False) 
-    instructors = Column(Text, nullable=True)  # Use Text to store JSON strings
-    students = Column(Text, nullable=True) 
+    date = Column(DateTime, nullable=False, index=True)  # Naive UTC; indexed for date-range scans
     description = Column(String(255), nullable=True)
 
+    instructor_links = relationship(
+        WorkshopInstructor, cascade="all, delete-orphan", passive_deletes=True, lazy="selectin",
+        order_by=(WorkshopInstructor.position, WorkshopInstructor.instructor_id),
+    )
+    student_links = relationship(
+        WorkshopStudent, cascade="all, delete-orphan", passive_deletes=True, lazy="selectin",
+        order_by=(WorkshopStudent.position, WorkshopStudent.student_id),
+    )
+
+    # Rosters are exposed as lists of id strings, the shape the API has always used
+    @property
+    def instructors(self):
+        return [str(link.instructor_id) for link in self.instructor_links]
+
+    @instructors.setter
+    def instructors(self, ids):
+        self.instructor_links = replace_links(
+            self.instructor_links, ids, "instructor_id", lambda i: WorkshopInstructor(instructor_id=i)
+        )
+
+    @property
+    def students(self):
+        return [str(link.student_id) for link in self.student_links]
+
+    @students.setter
+    def students(self, ids):
+        self.student_links = replace_links(
+            self.student_links, ids, "student_id", lambda i: WorkshopStudent(student_id=i)
+        )
+
     # def __repr__(self):
-    #     return f"<Workshop(id={self.id}, subject={self.subject}, date={self.date})>"
\ No newline at end of file
+    #     return f"<Workshop(id={self.id}, subject={self.subject}, date={self.date})>"
@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+from metrics import password_rejections, record_password_time
+import asyncio
+import os
+import time
+
+# Load environment variables
+load_dotenv()
+
+# bcrypt cost factor. Hashes made with a different cost are rehashed on login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# bcrypt releases the GIL, so a thread pool hashes in parallel without
+# holding up the event loop
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 2)))
+
+# Hash/verify calls allowed to wait for a worker before new ones are turned away
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+
+# Password hashing
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+in_flight = 0  # Only touched from the event loop thread
+
+# Run a blocking hash call on the pool, or fail fast with a 503 when it's saturated
+async def run_on_pool(operation, func, *args):
+    global in_flight
+    if in_flight >= PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT:
+        password_rejections.inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    in_flight += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        in_flight -= 1
+        record_password_time(operation, time.perf_counter() - start)
+
+async def hash_password(password: str) -> str:
+    return await run_on_pool("hash", pwd_context.hash, password)
+
+# Returns (valid, new_hash); new_hash is set when the stored hash should be upgraded
+async def verify_password(password: str, hashed: str):
+    return await run_on_pool("verify", pwd_context.verify_and_update, password, hashed)
+
+def shutdown_password_pool():
+    executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,31 @@
+from dotenv import load_dotenv
+import os
+import re
+
+# Load environment variables
+load_dotenv()
+
+# Where uploaded student pictures are served from, and the variants made of
+# each. Kept apart from pictures.py (FastAPI, PIL, the process pool) so the
+# models can compute thumbnail URLs without importing any of that.
+PICTURES_URL = os.getenv("PICTURES_URL", "/pictures")
+PICTURE_SIZES = [int(size) for size in os.getenv("PICTURE_SIZES", "96,320").split(",")]
+PICTURE_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+UPLOADED_PICTURE = re.compile(rf"^{re.escape(PICTURES_URL)}/([0-9a-f]{{64}})\.\w+$")
+
+def picture_url(digest, extension):
+    return f"{PICTURES_URL}/{digest}.{extension}"
+
+# Variant URLs ("96.webp" -> URL) for a picture that was uploaded here; None
+# for anything else (e.g. an external URL stored before uploads existed)
+def thumbnail_urls(picture):
+    match = UPLOADED_PICTURE.match(picture or "")
+    if not match:
+        return None
+    digest = match[1]
+    return {
+        f"{size}.{extension}": f"{PICTURES_URL}/{digest}/{size}.{extension}"
+        for size in PICTURE_SIZES
+        for extension in PICTURE_FORMATS
+    }
@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+
+from picture_urls import PICTURE_FORMATS, PICTURE_SIZES, picture_url
+
+# Load environment variables
+load_dotenv()
+
+# Uploaded student pictures. Originals are stored once under their SHA-256
+# (so re-uploads and shared pictures cost nothing) and never evicted.
+# Resized WebP and JPEG variants are made from them on a process pool and
+# kept in an on-disk cache capped at PICTURE_CACHE_MAX_BYTES, least recently
+# served first out; an evicted variant is simply made again when next asked for.
+# URLs, sizes and formats are in picture_urls.py.
+PICTURES_DIR = os.getenv("PICTURES_DIR", "./media/pictures")
+PICTURE_CACHE_MAX_BYTES = int(os.getenv("PICTURE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+MAX_PICTURE_BYTES = int(os.getenv("MAX_PICTURE_BYTES", str(10 * 1024 * 1024)))
+PICTURE_WORKERS = int(os.getenv("PICTURE_WORKERS", "2"))
+PICTURE_QUEUE_LIMIT = int(os.getenv("PICTURE_QUEUE_LIMIT", "16"))
+
+# Upload formats accepted, and the extension the original is stored under
+ORIGINAL_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+# Variant URLs never change meaning (the name is the content hash), so browsers may keep them for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+ORIGINALS_DIR = os.path.join(PICTURES_DIR, "originals")
+VARIANTS_DIR = os.path.join(PICTURES_DIR, "variants")
+
+def original_path(digest, extension):
+    return os.path.join(ORIGINALS_DIR, f"{digest}.{extension}")
+
+def variant_path(digest, size, extension):
+    return os.path.join(VARIANTS_DIR, f"{digest}_{size}.{extension}")
+
+# The next two run in the worker processes
+
+# Check an upload really is an image we accept; returns the stored extension
+def identify_image(data):
+    from io import BytesIO
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image.verify()
+            return ORIGINAL_FORMATS.get(image.format)
+    except Exception:
+        return None
+
+def write_variant(source, target, size, image_format):
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        temporary = f"{target}.{os.getpid()}.tmp"
+        image.save(temporary, image_format, quality=80, optimize=True)
+    os.replace(temporary, target)
+    return os.path.getsize(target)
+
+# Decoding and resizing hold the GIL, so they get processes of their own.
+# Spawned rather than forked: the server process already runs other threads.
+executor = ProcessPoolExecutor(max_workers=PICTURE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+in_flight = 0  # Only touched from the event loop thread
+
+# Run image work on the pool, or fail fast with a 503 when it's saturated
+async def run_on_pool(func, *args):
+    global in_flight
+    if in_flight >= PICTURE_WORKERS + PICTURE_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503, detail="Too many pictures being processed, please retry shortly", headers={"Retry-After": "1"}
+        )
+    in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        in_flight -= 1
+
+# On-disk variants in least-recently-served order, with their total size
+class VariantCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # path -> bytes
+        self.size = 0
+        self.pending = {}  # path -> future, so concurrent requests make a variant once
+
+    # Pick up what's already on disk, oldest modification first
+    def load(self, directory):
+        self.entries.clear()
+        self.size = 0
+        files = [entry for entry in os.scandir(directory) if entry.is_file() and not entry.name.endswith(".tmp")]
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            self.entries[entry.path] = entry.stat().st_size
+            self.size += self.entries[entry.path]
+        self.evict()
+
+    def touch(self, path):
+        if path in self.entries:
+            self.entries.move_to_end(path)
+            try:
+                os.utime(path)  # Keeps the order across restarts
+            except OSError:
+                pass
+
+    def add(self, path, size):
+        self.size += size - self.entries.pop(path, 0)
+        self.entries[path] = size
+        self.evict()
+
+    def evict(self):
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            path, size = self.entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {"variants": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+variant_cache = VariantCache(PICTURE_CACHE_MAX_BYTES)
+
+def init_pictures():
+    os.makedirs(ORIGINALS_DIR, exist_ok=True)
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    variant_cache.load(VARIANTS_DIR)
+
+def shutdown_picture_pool():
+    executor.shutdown(wait=False, cancel_futures=True)
+
+# Write an original once, under a temporary name first so readers never
+# see it half written (named per thread, as uploads are written off the loop)
+def write_original(path, data):
+    if not os.path.exists(path):
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+# Store an uploaded picture; returns its public URL
+async def store_picture(data):
+    digest = hashlib.sha256(data).hexdigest()
+    extension = await run_on_pool(identify_image, data)
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Upload a JPEG, PNG, WebP or GIF image")
+    await asyncio.to_thread(write_original, original_path(digest, extension), data)  # Up to MAX_PICTURE_BYTES
+    await asyncio.gather(*(
+        variant(digest, extension, size, variant_extension)
+        for size in PICTURE_SIZES
+        for variant_extension in PICTURE_FORMATS
+    ))
+    return picture_url(digest, extension)
+
+def find_original(digest):
+    for extension in ORIGINAL_FORMATS.values():
+        if os.path.exists(original_path(digest, extension)):
+            return extension
+    return None
+
+# Path of a variant, made from the original first if it isn't cached
+async def variant(digest, original_extension, size, extension):
+    path = variant_path(digest, size, extension)
+    if path in variant_cache.entries and os.path.exists(path):
+        variant_cache.touch(path)
+        return path
+    future = variant_cache.pending.get(path)
+    if future is None:
+        source = original_path(digest, original_extension)
+        future = asyncio.ensure_future(run_on_pool(write_variant, source, path, size, PICTURE_FORMATS[extension]))
+        variant_cache.pending[path] = future
+        try:
+            variant_cache.add(path, await future)
+        finally:
+            del variant_cache.pending[path]
+    else:
+        await future
+    return path
@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from dotenv import load_dotenv
+from models.database import request_routing
+import hashlib
+import os
+import re
+
+# Load environment variables
+load_dotenv()
+
+# In-process cache of serialized GET responses for the roster routers.
+#
+# Every cached entry is tagged ("students:list", "students:5", ...). Writes
+# bump the generation of the tags they affect; an entry is only served while
+# the generations it was built under are still current. With the default
+# backend the generations live in this process. Setting
+# RESPONSE_CACHE_REDIS_URL keeps them in Redis instead, so every uvicorn
+# worker sees every other worker's invalidations.
+#
+# With read replicas, the cache is bypassed for clients reading their own
+# writes, and responses read from a replica are never stored: a lagging
+# replica's page would otherwise be cached under the post-write generation
+# and served to everyone until the next write.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL")
+
+# Cached GET routes and the tags their responses depend on
+CACHED_ROUTES = [
+    (re.compile(r"^/(students|instructors|workshops)/$"), lambda m: [f"{m[1]}:list"]),
+    (re.compile(r"^/(students|instructors|workshops)/(\d+)$"), lambda m: [f"{m[1]}:{m[2]}"]),
+    (re.compile(r"^/(students|instructors)/(\d+)/workshops$"), lambda m: [f"{m[1]}:{m[2]}", "workshops:list"]),
+]
+
+# Workshops fetched with ?expand= embed roster records, so they also go
+# stale when any of the expanded instructors or students change
+def route_tags(path, expand=None):
+    for pattern, tags in CACHED_ROUTES:
+        match = pattern.match(path)
+        if match:
+            expanded = [f"{name.strip()}:list" for name in (expand or "").split(",") if name.strip()]
+            return tags(match) + expanded
+    return None
+
+# Tag generations kept in this process
+class LocalGenerations:
+    def __init__(self):
+        self.generations = {}
+
+    async def get(self, tags):
+        return [self.generations.get(tag, 0) for tag in tags]
+
+    async def bump(self, tags):
+        for tag in tags:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+
+# Tag generations shared between workers through Redis
+class RedisGenerations:
+    def __init__(self, url):
+        import redis.asyncio as redis  # Only needed when a shared backend is configured
+
+        self.redis = redis.from_url(url)
+
+    async def get(self, tags):
+        return [int(value or 0) for value in await self.redis.mget([f"response-cache:{tag}" for tag in tags])]
+
+    async def bump(self, tags):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(f"response-cache:{tag}")
+            await pipe.execute()
+
+class ResponseCache:
+    def __init__(self, max_entries, max_bytes, generations):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generations = generations
+        self.entries = OrderedDict()  # key -> (body, etag, headers, tags, generations)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or await self.generations.get(entry[3]) != entry[4]:
+            if entry is not None:
+                self.discard(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, body, etag, headers, tags, generations):
+        self.discard(key)
+        self.entries[key] = (body, etag, headers, tags, generations)
+        self.size += len(body)
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RedisGenerations(RESPONSE_CACHE_REDIS_URL) if RESPONSE_CACHE_REDIS_URL else LocalGenerations(),
+)
+
+# Drop the cached list pages of an entity and the detail pages of the given ids
+async def invalidate(entity, *ids):
+    if RESPONSE_CACHE_ENABLED:
+        await response_cache.generations.bump([f"{entity}:list"] + [f"{entity}:{i}" for i in ids])
+
+def make_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(request: Request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def cached_response(request: Request, body, etag, headers):
+    headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}  # Browsers revalidate with If-None-Match
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, headers=headers)
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        tags = route_tags(request.url.path, request.query_params.get("expand")) if request.method == "GET" else None
+        routing = request_routing.get()
+        if (
+            not RESPONSE_CACHE_ENABLED
+            or tags is None
+            or request.query_params.get("stream")
+            or (routing is not None and routing.route == "read_your_writes")
+        ):
+            return await call_next(request)
+
+        key = request.url.path + "?" + "&".join(sorted(str(request.query_params).split("&")))
+        entry = await response_cache.get(key)
+        if entry is not None:
+            return cached_response(request, entry[0], entry[1], entry[2])
+
+        # Read the generations before the handler runs, so a write that lands
+        # while it's running makes this entry stale straight away
+        generations = await response_cache.generations.get(tags)
+        response = await call_next(request)
+        if response.status_code != 200 or not response.headers.get("content-type", "").startswith("application/json"):
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = make_etag(body)
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+        if len(body) <= RESPONSE_CACHE_MAX_ENTRY_BYTES and (routing is None or routing.replica is None):
+            response_cache.put(key, body, etag, headers, tags, generations)
+        return cached_response(request, body, etag, headers)
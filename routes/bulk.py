@@ -0,0 +1,155 @@
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, inspect, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+
+from schemas.bulk import BulkItemResult
+
+# Whether an IntegrityError is a unique index violation rather than, say, a
+# foreign key (MySQL error 1062, or SQLite's message)
+def duplicate_key(error: IntegrityError):
+    args = getattr(error.orig, "args", ())
+    return (args and args[0] == 1062) or "UNIQUE constraint failed" in str(error.orig)
+
+# Whether an IntegrityError is a NOT NULL column set to None (MySQL error 1048)
+def missing_value(error: IntegrityError):
+    args = getattr(error.orig, "args", ())
+    return (args and args[0] == 1048) or "NOT NULL constraint failed" in str(error.orig)
+
+# Turn a natural key (a name, a workshop's subject and date) that is already
+# taken into an HTTP error. The unique index is the check, so concurrent
+# creates can't both get through.
+@asynccontextmanager
+async def unique_keys(db: AsyncSession, detail, status_code=400):
+    try:
+        yield
+    except IntegrityError as error:
+        await db.rollback()
+        if duplicate_key(error):
+            raise HTTPException(status_code=status_code, detail=detail)
+        raise
+
+async def commit_unique(db: AsyncSession, detail, status_code=400):
+    async with unique_keys(db, detail, status_code):
+        await db.commit()
+
+# Rows per multi-row INSERT statement in bulk_insert
+INSERT_CHUNK_SIZE = 500
+
+# Which rows hold the given natural keys (tuples of the `natural_key`
+# columns' values), as key -> id, with a single IN query
+async def ids_by_key(db: AsyncSession, model, natural_key, keys):
+    keys = {key for key in keys if None not in key}
+    if not keys:
+        return {}
+    columns = [getattr(model, name) for name in natural_key]
+    if len(columns) == 1:
+        condition = columns[0].in_([key[0] for key in keys])
+    else:
+        condition = tuple_(*columns).in_(keys)
+    return {tuple(key): row_id for row_id, *key in await db.execute(select(model.id, *columns).filter(condition))}
+
+# Load the rows for a set of ids with a single IN query
+async def load_by_ids(db: AsyncSession, model, ids):
+    if not ids:
+        return {}
+    rows = (await db.scalars(select(model).filter(model.id.in_(ids)))).all()
+    return {row.id: row for row in rows}
+
+# Which of a set of ids exist, with a single IN query
+async def existing_ids(db: AsyncSession, model, ids):
+    if not ids:
+        return set()
+    return set((await db.scalars(select(model.id).filter(model.id.in_(ids)))).all())
+
+# Apply a list of partial updates in one transaction. `check` may return
+# an error message to reject an item before anything is written. An update
+# that would give a row a `natural_key` another row (or an earlier item)
+# already has is rejected with `duplicate`; the new keys are looked up with
+# one IN query. Returns the per-item results and the rows that were changed.
+async def bulk_update(
+    db: AsyncSession, model, items, not_found, check=None, natural_key=(),
+    duplicate="Update would duplicate an existing row",
+):
+    rows = await load_by_ids(db, model, {item.id for item in items})
+    changes = [item.dict(exclude_unset=True, exclude={"id"}) for item in items]
+
+    def new_key(row, change):
+        return tuple(change.get(name, getattr(row, name)) for name in natural_key)
+
+    rekeyed = [
+        (row, change) for row, change in ((rows.get(item.id), change) for item, change in zip(items, changes))
+        if row is not None and any(name in change for name in natural_key)
+    ]
+    owners = await ids_by_key(db, model, natural_key, [new_key(row, change) for row, change in rekeyed])
+
+    results, updated = [], []
+    for index, (item, change) in enumerate(zip(items, changes)):
+        row = rows.get(item.id)
+        error = not_found if row is None else (check(item) if check else None)
+        key = new_key(row, change) if row is not None and natural_key else None
+        if not error and key is not None and owners.get(key, row.id) != row.id:
+            error = duplicate
+        if error:
+            results.append(BulkItemResult(index=index, id=item.id, status="error", detail=error))
+            continue
+        if key is not None:
+            owners[key] = row.id  # Later items can't take it either
+        for name, value in change.items():
+            setattr(row, name, value)
+        results.append(BulkItemResult(index=index, id=item.id, status="updated"))
+        updated.append(row)
+    await commit_unique(db, "A row in this batch was changed by another request meanwhile; retry", status_code=409)
+    return results, updated
+
+# Delete a list of ids with one SELECT and one DELETE
+async def bulk_delete(db: AsyncSession, model, ids, not_found):
+    found = await existing_ids(db, model, ids)
+    if found:
+        await db.execute(delete(model).filter(model.id.in_(found)))
+    await db.commit()
+    return [
+        BulkItemResult(index=index, id=row_id, status="deleted")
+        if row_id in found
+        else BulkItemResult(index=index, id=row_id, status="error", detail=not_found)
+        for index, row_id in enumerate(ids)
+    ]
+
+# Ids of the items that ended with the given status
+def result_ids(results, status):
+    return [result.id for result in results if result.status == status]
+
+# Column values of a row built in memory, for a core INSERT
+def column_values(row):
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns if column.key != "id"}
+
+# Insert the accepted rows in one transaction and fill in their new ids.
+# The rows go in as multi-row INSERT statements (MySQL has no RETURNING, so
+# the ORM would send one INSERT per row to learn each id), and the ids are
+# then read back by `natural_key` with one IN query. `links` names the
+# relationships whose rows (the workshop rosters) are inserted the same way
+# once their parents' ids are known. Duplicates are weeded out beforehand,
+# so a unique violation here means a concurrent request created one of the
+# rows first.
+async def bulk_insert(db: AsyncSession, model, created, natural_key, links=()):
+    rows = [row for _, row in created]
+    async with unique_keys(db, "A row in this batch was created by another request meanwhile; retry", status_code=409):
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            await db.execute(insert(model).values([column_values(row) for row in rows[start:start + INSERT_CHUNK_SIZE]]))
+        ids = await ids_by_key(db, model, natural_key, [tuple(getattr(row, name) for name in natural_key) for row in rows])
+        for result, row in created:
+            row.id = result.id = ids[tuple(getattr(row, name) for name in natural_key)]
+
+        for name in links:
+            relationship = inspect(model).relationships[name]
+            (parent_key,) = [column.key for column in relationship.remote_side]
+            children = []
+            for row in rows:
+                for child in getattr(row, name):
+                    setattr(child, parent_key, row.id)
+                    children.append(child)
+            for start in range(0, len(children), INSERT_CHUNK_SIZE):
+                chunk = children[start:start + INSERT_CHUNK_SIZE]
+                await db.execute(insert(relationship.mapper.class_).values([column_values(child) for child in chunk]))
+        await db.commit()
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import orjson
+
+from events import EVENT_ENTITIES, IDLE, RESET, broker
+
+# Initialize the router
+router = APIRouter()
+
+# Milliseconds EventSource waits before reconnecting after the stream ends
+RECONNECT_MS = 1000
+
+def parse_topics(topics: Optional[str]):
+    if topics is None:
+        return set(EVENT_ENTITIES)
+    names = {name.strip() for name in topics.split(",") if name.strip()}
+    unknown = sorted(names - set(EVENT_ENTITIES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(unknown)}")
+    return names
+
+async def event_stream(topics, last_id):
+    yield f"retry: {RECONNECT_MS}\n\n".encode()
+    async for event_id, event in broker.subscribe(last_id):
+        if event_id is IDLE:
+            yield b": keepalive\n\n"
+        elif event_id is RESET:
+            yield b"event: reset\ndata: {}\n\n"
+        elif event["entity"] in topics:
+            yield b"id: " + event_id.encode() + b"\nevent: change\ndata: " + orjson.dumps(event) + b"\n\n"
+
+# GET endpoint streaming changes as server-sent events:
+#
+#     id: 42
+#     event: change
+#     data: {"entity": "students", "action": "updated", "ids": [5]}
+#
+# ?topics=students,workshops limits the entities sent. EventSource resumes
+# from the Last-Event-ID header by itself after a dropped connection (or pass
+# ?last_event_id=). A "reset" event means events were missed and the client
+# should refetch what it shows.
+@router.get("/events")
+async def get_events(
+    topics: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    topics = parse_topics(topics)
+    return StreamingResponse(
+        event_stream(topics, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # Don't let proxies hold events back
+    )
@@ -0,0 +1,40 @@
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import lazyload, load_only, selectinload
+from typing import Optional
+import orjson
+
+# Parse ?fields=id,name into the requested response fields, in order
+def parse_fields(fields: Optional[str], response_model):
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in response_model.model_fields]
+    if not names:
+        raise HTTPException(status_code=400, detail="No fields requested")
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+# Restrict a select(model) to the columns behind the requested fields.
+# `relationships` maps a field to the relationship it is built from; those
+# are loaded only when the field is asked for. `derived` maps a computed field
+# to the columns it is computed from.
+def load_fields(query, model, names, relationships=None, derived=None):
+    names = names + [column for name in names for column in (derived or {}).get(name, ())]
+    columns = [getattr(model, name) for name in dict.fromkeys(names) if name in model.__table__.columns]
+    options = [load_only(*columns)] if columns else [load_only(model.id)]
+    for name, relationship in (relationships or {}).items():
+        options.append(selectinload(relationship) if name in names else lazyload(relationship))
+    return query.options(*options)
+
+# The requested fields of a loaded row, without building a response model
+def pick(row, names):
+    return {name: getattr(row, name) for name in names}
+
+def dump_fields(row, names):
+    return orjson.dumps(pick(row, names)).decode()
+
+# Keeps headers already set on `response` (the next cursor)
+def fields_response(rows, names, response=None):
+    return ORJSONResponse([pick(row, names) for row in rows], headers=response.headers if response else None)
@@ -1,92 +1,202 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
-import json
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from functools import partial
+from typing import List, Optional
 
-from schemas.instructors import InstructorCreate, InstructorResponse, InstructorUpdate
+from schemas.instructors import InstructorBulkUpdate, InstructorCreate, InstructorResponse, InstructorUpdate
+from schemas.bulk import MAX_BULK_SIZE, BulkDelete, BulkItemResult
+from schemas.workshops import WorkshopResponse
 from models.database import get_db
+from routes.bulk import bulk_delete, bulk_insert, bulk_update, commit_unique, result_ids
+from response_cache import invalidate
+from search import index_rows, unindex_rows
+from events import publish
+from stats import forget_rows, record_rows
+from matching import index_instructors, unindex_instructors
+from routes.fields import dump_fields, fields_response, load_fields, parse_fields, pick
+from routes.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset, set_next_cursor, stream_ndjson
+from routes.rows import FAST_RESPONSES, RowEncoder
 from models.instructors import Instructor
+from models.workshops import Workshop, WorkshopInstructor
 
 # Initialize the router
 router = APIRouter()
 
 # POST endpoint to create a new instructor
 @router.post("/instructors/", response_model=InstructorResponse)
-async def create_instructor(instructor: InstructorCreate, db: Session = Depends(get_db)):
-    # Serialize the skills field to JSON
+async def create_instructor(instructor: InstructorCreate, db: AsyncSession = Depends(get_db)):
+    # One INSERT; the unique index on name turns a duplicate into a 400
     new_instructor = Instructor(
         name=instructor.name,
-        skills=json.dumps(instructor.skills) if instructor.skills else "[]",  # Serialize list to JSON string
+        skills=instructor.skills or [],  # Encoded to JSON by the column type
         bio=instructor.bio
     )
     db.add(new_instructor)
-    db.commit()
-    db.refresh(new_instructor)
-
-    # Deserialize skills for the response
-    new_instructor.skills = json.loads(new_instructor.skills)
+    await commit_unique(db, "Instructor already exists")
+    await invalidate("instructors")
+    index_rows("instructors", [new_instructor])
+    record_rows("instructors", [new_instructor])
+    index_instructors([new_instructor])
+    await publish("instructors", "created", [new_instructor.id])
     return new_instructor
 
-# GET endpoint to retrieve all instructors
+# POST endpoint to create many instructors in one transaction
+@router.post("/instructors/bulk", response_model=List[BulkItemResult])
+async def create_instructors_bulk(
+    instructors: List[InstructorCreate] = Body(..., max_length=MAX_BULK_SIZE), db: AsyncSession = Depends(get_db)
+):
+    # One IN query finds every name in the batch that already exists
+    names = {instructor.name for instructor in instructors}
+    existing = set((await db.scalars(select(Instructor.name).filter(Instructor.name.in_(names)))).all())
+
+    results, created = [], []
+    for index, instructor in enumerate(instructors):
+        if instructor.name in existing:
+            results.append(BulkItemResult(index=index, status="error", detail="Instructor already exists"))
+            continue
+        existing.add(instructor.name)  # Repeats within the batch are duplicates too
+        result = BulkItemResult(index=index, status="created")
+        new_instructor = Instructor(
+            name=instructor.name,
+            skills=instructor.skills or [],
+            bio=instructor.bio
+        )
+        results.append(result)
+        created.append((result, new_instructor))
+
+    await bulk_insert(db, Instructor, created, natural_key=("name",))
+    await invalidate("instructors")
+    index_rows("instructors", [row for _, row in created])
+    record_rows("instructors", [row for _, row in created])
+    index_instructors([row for _, row in created])
+    await publish("instructors", "created", [row.id for _, row in created])
+    return results
+
+# Workshops these instructors teach, which change when they're deleted
+async def workshops_of_instructors(db: AsyncSession, instructor_ids):
+    query = select(WorkshopInstructor.workshop_id).filter(WorkshopInstructor.instructor_id.in_(instructor_ids)).distinct()
+    return (await db.scalars(query)).all()
+
+# PATCH endpoint to update many instructors in one transaction
+@router.patch("/instructors/bulk", response_model=List[BulkItemResult])
+async def update_instructors_bulk(
+    updates: List[InstructorBulkUpdate] = Body(..., max_length=MAX_BULK_SIZE), db: AsyncSession = Depends(get_db)
+):
+    results, updated = await bulk_update(
+        db, Instructor, updates, "Instructor not found", natural_key=("name",), duplicate="Instructor already exists"
+    )
+    await invalidate("instructors", *result_ids(results, "updated"))
+    index_rows("instructors", updated)
+    record_rows("instructors", updated)
+    index_instructors(updated)
+    await publish("instructors", "updated", result_ids(results, "updated"))
+    return results
+
+# DELETE endpoint to delete many instructors by ID
+@router.delete("/instructors/bulk", response_model=List[BulkItemResult])
+async def delete_instructors_bulk(payload: BulkDelete, db: AsyncSession = Depends(get_db)):
+    workshop_ids = await workshops_of_instructors(db, payload.ids)
+    results = await bulk_delete(db, Instructor, payload.ids, "Instructor not found")
+    await invalidate("instructors", *result_ids(results, "deleted"))
+    unindex_rows("instructors", *result_ids(results, "deleted"))
+    forget_rows("instructors", result_ids(results, "deleted"), workshop_ids)
+    unindex_instructors(*result_ids(results, "deleted"))
+    await invalidate("workshops", *workshop_ids)
+    await publish("instructors", "deleted", result_ids(results, "deleted"))
+    await publish("workshops", "updated", workshop_ids)  # Their rosters lost these instructors
+    return results
+
+# Serialize an instructor as one line of NDJSON
+def instructor_to_json(instructor):
+    return InstructorResponse.model_validate(instructor).model_dump_json()
+
+# Instructor pages as JSON straight from the rows (FAST_RESPONSES)
+instructor_rows = RowEncoder(Instructor, InstructorResponse)
+
+# GET endpoint to retrieve instructors, one keyset page at a time or streamed as NDJSON.
+# ?fields=id,name loads and returns only those fields.
 @router.get("/instructors/", response_model=List[InstructorResponse])
-async def get_instructors(db: Session = Depends(get_db)):
-    instructors = db.query(Instructor).all()
-    for instructor in instructors:
-        # Deserialize JSON strings back to Python lists
-        if isinstance(instructor.skills, str):
-            try:
-                instructor.skills = json.loads(instructor.skills)
-            except json.JSONDecodeError:
-                instructor.skills = []  # Default to an empty list if deserialization fails
+async def get_instructors(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    names = parse_fields(fields, InstructorResponse)
+    query = select(Instructor) if names is None else load_fields(select(Instructor), Instructor, names)
+    if stream:
+        serialize = instructor_to_json if names is None else partial(dump_fields, names=names)
+        return stream_ndjson(keyset(query, Instructor.id, after_id, limit), serialize)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    if FAST_RESPONSES and names is None:
+        rows = (await db.execute(keyset(instructor_rows.query(), Instructor.id, after_id, limit))).all()
+        set_next_cursor(response, rows[-1].id if rows else None, len(rows), limit)
+        return await instructor_rows.response(db, rows, response)
+    instructors = (await db.scalars(keyset(query, Instructor.id, after_id, limit))).all()
+    set_next_cursor(response, instructors[-1].id if instructors else None, len(instructors), limit)
+    if names is not None:
+        return fields_response(instructors, names, response)
     return instructors
 
 # GET endpoint to retrieve a single instructor by ID
 @router.get("/instructors/{instructor_id}", response_model=InstructorResponse)
-async def get_instructor(instructor_id: int, db: Session = Depends(get_db)):
-    instructor = db.query(Instructor).filter(Instructor.id == instructor_id).first()
+async def get_instructor(instructor_id: int, fields: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    names = parse_fields(fields, InstructorResponse)
+    query = select(Instructor) if names is None else load_fields(select(Instructor), Instructor, names)
+    instructor = await db.scalar(query.filter(Instructor.id == instructor_id))
     if not instructor:
         raise HTTPException(status_code=404, detail="Instructor not found")
-
-    # Deserialize JSON strings back to Python lists
-    if isinstance(instructor.skills, str):
-        try:
-            instructor.skills = json.loads(instructor.skills)
-        except json.JSONDecodeError:
-            instructor.skills = []  # Default to an empty list if deserialization fails
+    if names is not None:
+        return ORJSONResponse(pick(instructor, names))
     return instructor
 
+# GET endpoint to list the workshops an instructor teaches (one lookup on workshop_instructors.instructor_id)
+@router.get("/instructors/{instructor_id}/workshops", response_model=List[WorkshopResponse])
+async def get_instructor_workshops(instructor_id: int, db: AsyncSession = Depends(get_db)):
+    query = select(Workshop).join(WorkshopInstructor).filter(WorkshopInstructor.instructor_id == instructor_id).order_by(Workshop.id)
+    return (await db.scalars(query)).all()
+
 # PUT endpoint to update an instructor by ID
 @router.put("/instructors/{instructor_id}", response_model=InstructorResponse)
-async def update_instructor(instructor_id: int, updated_data: InstructorUpdate, db: Session = Depends(get_db)):
-    instructor = db.query(Instructor).filter(Instructor.id == instructor_id).first()
+async def update_instructor(instructor_id: int, updated_data: InstructorUpdate, db: AsyncSession = Depends(get_db)):
+    instructor = await db.scalar(select(Instructor).filter(Instructor.id == instructor_id))
     if not instructor:
         raise HTTPException(status_code=404, detail="Instructor not found")
 
     # Update only the fields provided in the request body
     update_data = updated_data.dict(exclude_unset=True)
     for key, value in update_data.items():
-        if key == "skills" and isinstance(value, list):  # Serialize skills if it's a list
-            value = json.dumps(value)
         setattr(instructor, key, value)
 
-    db.commit()
-    db.refresh(instructor)
-
-    # Deserialize skills for the response
-    if isinstance(instructor.skills, str):
-        try:
-            instructor.skills = json.loads(instructor.skills)
-        except json.JSONDecodeError:
-            instructor.skills = []  # Default to an empty list if deserialization fails
+    await commit_unique(db, "Instructor already exists")
+    await db.refresh(instructor)
+    await invalidate("instructors", instructor_id)
+    index_rows("instructors", [instructor])
+    record_rows("instructors", [instructor])
+    index_instructors([instructor])
+    await publish("instructors", "updated", [instructor_id])
     return instructor
 
 # DELETE endpoint to delete an instructor by ID
 @router.delete("/instructors/{instructor_id}")
-async def delete_instructor(instructor_id: int, db: Session = Depends(get_db)):
-    instructor = db.query(Instructor).filter(Instructor.id == instructor_id).first()
+async def delete_instructor(instructor_id: int, db: AsyncSession = Depends(get_db)):
+    instructor = await db.scalar(select(Instructor).filter(Instructor.id == instructor_id))
     if not instructor:
         raise HTTPException(status_code=404, detail="Instructor not found")
 
-    db.delete(instructor)
-    db.commit()
+    workshop_ids = await workshops_of_instructors(db, [instructor_id])
+    await db.delete(instructor)
+    await db.commit()
+    await invalidate("instructors", instructor_id)
+    await invalidate("workshops", *workshop_ids)
+    unindex_rows("instructors", instructor_id)
+    forget_rows("instructors", [instructor_id], workshop_ids)
+    unindex_instructors(instructor_id)
+    await publish("instructors", "deleted", [instructor_id])
+    await publish("workshops", "updated", workshop_ids)
     return {"message": "Instructor deleted successfully"}
\ No newline at end of file
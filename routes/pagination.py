@@ -0,0 +1,62 @@
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select
+import os
+
+from models.database import session
+
+# Page size settings for the collection endpoints
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# Header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-After-Id"
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Restrict a select() to the rows after the cursor, in id order
+def keyset(query, id_column, after_id=None, limit=None):
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    query = query.order_by(id_column)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+# Like keyset(), but ordered by another column with ties broken by id. The
+# cursor is still the last id seen; its sort value is looked up by a
+# subquery, so the page is one range scan on an index over (column, id).
+def keyset_by(query, column, id_column, after_id=None, limit=None, descending=False):
+    if after_id is not None:
+        last = select(column).filter(id_column == after_id).scalar_subquery()
+        if descending:
+            query = query.filter(column <= last, or_(column < last, id_column < after_id))
+        else:
+            query = query.filter(column >= last, or_(column > last, id_column > after_id))
+    if descending:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column, id_column)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+# Point the client at the next page when this one came back full
+def set_next_cursor(response: Response, last_id, count, limit):
+    if count == limit and last_id is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(last_id)
+
+# Stream the rows of a select() as NDJSON from a server-side cursor.
+# The request's session is closed before the body is sent, so the stream
+# opens its own.
+def stream_ndjson(query, serialize):
+    async def rows():
+        async with session() as db:
+            result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for obj in result.scalars():
+                yield serialize(obj) + "\n"
+
+    return StreamingResponse(rows(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Depends, File, Path, UploadFile
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import get_db
+from models.students import Student
+from schemas.students import StudentResponse
+from pictures import (
+    IMMUTABLE_CACHE_CONTROL, MAX_PICTURE_BYTES, ORIGINAL_FORMATS, PICTURE_FORMATS, PICTURE_SIZES,
+    find_original, original_path, store_picture, variant,
+)
+from response_cache import invalidate
+from events import publish
+
+# Initialize the router
+router = APIRouter()
+
+DIGEST = Path(pattern=r"^[0-9a-f]{64}$")
+
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp", "gif": "image/gif"}
+
+# POST endpoint to upload a student's picture. The original is kept under its
+# content hash and the thumbnails are made before replying, so the URLs in
+# the response work straight away.
+@router.post("/students/{student_id}/picture", response_model=StudentResponse)
+async def upload_student_picture(student_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    student = await db.scalar(select(Student).filter(Student.id == student_id))
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    data = await file.read(MAX_PICTURE_BYTES + 1)
+    if len(data) > MAX_PICTURE_BYTES:
+        raise HTTPException(status_code=413, detail=f"Pictures are limited to {MAX_PICTURE_BYTES} bytes")
+
+    student.picture = await store_picture(data)
+    await db.commit()
+    await db.refresh(student)
+    await invalidate("students", student_id)
+    await publish("students", "updated", [student_id])
+    return student
+
+# GET endpoint to serve an uploaded original
+@router.get("/pictures/{digest}.{extension}")
+async def get_picture(digest: str = DIGEST, extension: str = Path()):
+    if extension not in ORIGINAL_FORMATS.values() or find_original(digest) != extension:
+        raise HTTPException(status_code=404, detail="Picture not found")
+    return FileResponse(
+        original_path(digest, extension), media_type=MEDIA_TYPES[extension], headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    )
+
+# GET endpoint to serve a thumbnail, remade from the original if it was evicted
+@router.get("/pictures/{digest}/{size}.{extension}")
+async def get_thumbnail(digest: str = DIGEST, size: int = Path(), extension: str = Path()):
+    if size not in PICTURE_SIZES or extension not in PICTURE_FORMATS:
+        raise HTTPException(status_code=404, detail="Picture not found")
+    original_extension = find_original(digest)
+    if original_extension is None:
+        raise HTTPException(status_code=404, detail="Picture not found")
+    path = await variant(digest, original_extension, size, extension)
+    return FileResponse(path, media_type=MEDIA_TYPES[extension], headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from models.database import get_db
+from models.instructors import Instructor
+from models.students import Student
+from models.workshops import Workshop
+from schemas.search import SearchResult
+from search import SEARCH_FIELDS, search_index
+
+# Initialize the router
+router = APIRouter()
+
+MAX_SEARCH_RESULTS = 100
+
+# Column shown as the title of each kind of result
+TITLE_COLUMNS = {
+    "instructors": (Instructor.id, Instructor.name),
+    "students": (Student.id, Student.name),
+    "workshops": (Workshop.id, Workshop.subject),
+}
+
+# GET endpoint to search instructor skills and bios, student reasons and
+# workshop subjects and descriptions. ?types=instructors,workshops narrows it.
+@router.get("/search", response_model=List[SearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    db: AsyncSession = Depends(get_db),
+):
+    entities = None
+    if types:
+        entities = list(dict.fromkeys(name.strip() for name in types.split(",") if name.strip()))
+        unknown = [name for name in entities if name not in SEARCH_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+
+    matches = search_index.search(q, entities, limit)
+
+    # One IN query per type for the titles; rows deleted since they were indexed drop out
+    titles = {}
+    for entity in {entity for entity, _, _ in matches}:
+        id_column, title_column = TITLE_COLUMNS[entity]
+        ids = [row_id for match_entity, row_id, _ in matches if match_entity == entity]
+        rows = await db.execute(select(id_column, title_column).filter(id_column.in_(ids)))
+        titles.update({(entity, row_id): title for row_id, title in rows})
+
+    return [
+        SearchResult(type=entity, id=row_id, title=titles[entity, row_id], score=round(score, 4))
+        for entity, row_id, score in matches
+        if (entity, row_id) in titles
+    ]
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.database import get_db
+from models.instructors import Instructor
+from models.workshops import Workshop
+from schemas.stats import DistributionStats, LabelStats
+from stats import stats
+
+# Initialize the router
+router = APIRouter()
+
+MAX_STATS_ROWS = 100
+
+def label_stats(summary):
+    return {
+        "rows": summary["rows"],
+        "distinct": summary["distinct"],
+        "top": [{"label": label, "count": count} for label, count in summary["top"]],
+    }
+
+# The top rows get their name or subject from one IN query
+async def distribution_stats(db: AsyncSession, summary, id_column, title_column):
+    ids = [row_id for row_id, _ in summary["top"]]
+    titles = dict((await db.execute(select(id_column, title_column).filter(id_column.in_(ids)))).all()) if ids else {}
+    return {
+        **summary,
+        "distribution": [{"size": size, "count": count} for size, count in summary["distribution"]],
+        "top": [{"id": row_id, "title": titles[row_id], "size": size} for row_id, size in summary["top"] if row_id in titles],
+    }
+
+# GET endpoint for how many instructors list each skill
+@router.get("/stats/skills", response_model=LabelStats)
+async def get_skill_stats(limit: int = Query(20, ge=1, le=MAX_STATS_ROWS)):
+    return label_stats(stats.skill_counts(limit))
+
+# GET endpoint for how many students give each reason
+@router.get("/stats/reasons", response_model=LabelStats)
+async def get_reason_stats(limit: int = Query(20, ge=1, le=MAX_STATS_ROWS)):
+    return label_stats(stats.reason_counts(limit))
+
+# GET endpoint for students per workshop: summary, distribution and the largest workshops
+@router.get("/stats/workshops", response_model=DistributionStats)
+async def get_workshop_stats(limit: int = Query(10, ge=1, le=MAX_STATS_ROWS), db: AsyncSession = Depends(get_db)):
+    return await distribution_stats(db, stats.workshop_sizes(limit), Workshop.id, Workshop.subject)
+
+# GET endpoint for workshops per instructor: summary, distribution and the busiest instructors
+@router.get("/stats/instructors", response_model=DistributionStats)
+async def get_instructor_stats(limit: int = Query(10, ge=1, le=MAX_STATS_ROWS), db: AsyncSession = Depends(get_db)):
+    return await distribution_stats(db, stats.instructor_load(limit), Instructor.id, Instructor.name)
@@ -1,74 +1,177 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.students import Student
-from schemas.students import StudentCreate, StudentResponse, StudentUpdate
+from models.workshops import Workshop, WorkshopStudent
+from schemas.students import StudentBulkUpdate, StudentCreate, StudentResponse, StudentUpdate
+from schemas.bulk import MAX_BULK_SIZE, BulkDelete, BulkItemResult
+from schemas.workshops import WorkshopResponse
 from models.database import get_db
-from typing import List
+from routes.bulk import bulk_delete, bulk_insert, bulk_update, commit_unique, result_ids
+from routes.fields import dump_fields, fields_response, load_fields, parse_fields, pick
+from routes.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset, set_next_cursor, stream_ndjson
+from routes.rows import FAST_RESPONSES, RowEncoder
+from picture_urls import thumbnail_urls
+from response_cache import invalidate
+from search import index_rows, unindex_rows
+from events import publish
+from stats import forget_rows, record_rows
+from functools import partial
+from typing import List, Optional
 import logging
-import json
 
 # Initialize the router
 router = APIRouter()
 
+# Response fields computed from columns rather than loaded directly
+DERIVED_FIELDS = {"thumbnails": ["picture"]}
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
 # POST endpoint to create a new student
 @router.post("/students/", response_model=StudentResponse)
-async def create_student(student: StudentCreate, db: Session = Depends(get_db)):
+async def create_student(student: StudentCreate, db: AsyncSession = Depends(get_db)):
     logging.info(f"Received student data: {student}")
-    
-    # Check if the student already exists
-    db_student = db.query(Student).filter(Student.name == student.name).first()
-    if db_student:
-        raise HTTPException(status_code=400, detail="Student already exists")
-    
-    # Create a new student record
+
+    # One INSERT; the unique index on name turns a duplicate into a 400
     new_student = Student(
         name=student.name,
-        reasons=json.dumps(student.reasons) if student.reasons else "[]",  # Serialize list to JSON string
+        reasons=student.reasons or [],  # Encoded to JSON by the column type
         picture=student.picture,
     )
     db.add(new_student)
-    db.commit()
-    db.refresh(new_student)
-    
-    # Deserialize reasons for the response
-    new_student.reasons = json.loads(new_student.reasons)
+    await commit_unique(db, "Student already exists")
+    await invalidate("students")
+    index_rows("students", [new_student])
+    record_rows("students", [new_student])
+    await publish("students", "created", [new_student.id])
     return new_student
 
-# GET endpoint to retrieve all students
+# POST endpoint to create many students in one transaction
+@router.post("/students/bulk", response_model=List[BulkItemResult])
+async def create_students_bulk(
+    students: List[StudentCreate] = Body(..., max_length=MAX_BULK_SIZE), db: AsyncSession = Depends(get_db)
+):
+    # One IN query finds every name in the batch that already exists
+    names = {student.name for student in students}
+    existing = set((await db.scalars(select(Student.name).filter(Student.name.in_(names)))).all())
+
+    results, created = [], []
+    for index, student in enumerate(students):
+        if student.name in existing:
+            results.append(BulkItemResult(index=index, status="error", detail="Student already exists"))
+            continue
+        existing.add(student.name)  # Repeats within the batch are duplicates too
+        result = BulkItemResult(index=index, status="created")
+        new_student = Student(
+            name=student.name,
+            reasons=student.reasons or [],  # Encoded to JSON by the column type
+            picture=student.picture,
+        )
+        results.append(result)
+        created.append((result, new_student))
+
+    await bulk_insert(db, Student, created, natural_key=("name",))
+    await invalidate("students")
+    index_rows("students", [row for _, row in created])
+    record_rows("students", [row for _, row in created])
+    await publish("students", "created", [row.id for _, row in created])
+    return results
+
+# Workshops whose rosters include these students, and so change when they're
+# deleted: one entry per roster place, so a workshop can be listed more than once
+async def workshops_of_students(db: AsyncSession, student_ids):
+    query = select(WorkshopStudent.workshop_id).filter(WorkshopStudent.student_id.in_(student_ids))
+    return (await db.scalars(query)).all()
+
+# PATCH endpoint to update many students in one transaction
+@router.patch("/students/bulk", response_model=List[BulkItemResult])
+async def update_students_bulk(
+    updates: List[StudentBulkUpdate] = Body(..., max_length=MAX_BULK_SIZE), db: AsyncSession = Depends(get_db)
+):
+    results, updated = await bulk_update(
+        db, Student, updates, "Student not found", natural_key=("name",), duplicate="Student already exists"
+    )
+    await invalidate("students", *result_ids(results, "updated"))
+    index_rows("students", updated)
+    record_rows("students", updated)
+    await publish("students", "updated", result_ids(results, "updated"))
+    return results
+
+# DELETE endpoint to delete many students by ID
+@router.delete("/students/bulk", response_model=List[BulkItemResult])
+async def delete_students_bulk(payload: BulkDelete, db: AsyncSession = Depends(get_db)):
+    roster_places = await workshops_of_students(db, payload.ids)
+    workshop_ids = list(dict.fromkeys(roster_places))
+    results = await bulk_delete(db, Student, payload.ids, "Student not found")
+    await invalidate("students", *result_ids(results, "deleted"))
+    unindex_rows("students", *result_ids(results, "deleted"))
+    forget_rows("students", result_ids(results, "deleted"), roster_places)
+    await invalidate("workshops", *workshop_ids)
+    await publish("students", "deleted", result_ids(results, "deleted"))
+    await publish("workshops", "updated", workshop_ids)  # Their rosters lost these students
+    return results
+
+# Serialize a student as one line of NDJSON
+def student_to_json(student):
+    return StudentResponse.model_validate(student, from_attributes=True).model_dump_json()
+
+# Student pages as JSON straight from the rows (FAST_RESPONSES)
+student_rows = RowEncoder(Student, StudentResponse, derived={"thumbnails": (thumbnail_urls, "picture")})
+
+# GET endpoint to retrieve students, one keyset page at a time or streamed as NDJSON.
+# ?fields=id,name loads and returns only those fields.
 @router.get("/students/", response_model=List[StudentResponse])
-async def get_students(db: Session = Depends(get_db)):
-    students = db.query(Student).all()
-    for student in students:
-        if isinstance(student.reasons, str):  # If reasons is a JSON string
-            try:
-                student.reasons = json.loads(student.reasons)  # Deserialize JSON string
-            except json.JSONDecodeError:
-                student.reasons = []  # Default to an empty list if deserialization fails
+async def get_students(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    names = parse_fields(fields, StudentResponse)
+    query = select(Student) if names is None else load_fields(select(Student), Student, names, derived=DERIVED_FIELDS)
+    if stream:
+        serialize = student_to_json if names is None else partial(dump_fields, names=names)
+        return stream_ndjson(keyset(query, Student.id, after_id, limit), serialize)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    if FAST_RESPONSES and names is None:
+        rows = (await db.execute(keyset(student_rows.query(), Student.id, after_id, limit))).all()
+        set_next_cursor(response, rows[-1].id if rows else None, len(rows), limit)
+        return await student_rows.response(db, rows, response)
+    students = (await db.scalars(keyset(query, Student.id, after_id, limit))).all()
+    set_next_cursor(response, students[-1].id if students else None, len(students), limit)
+    if names is not None:
+        return fields_response(students, names, response)
     return students
 
 # GET endpoint to retrieve a single student by ID
 @router.get("/students/{student_id}", response_model=StudentResponse)
-async def get_student(student_id: int, db: Session = Depends(get_db)):
-    student = db.query(Student).filter(Student.id == student_id).first()
+async def get_student(student_id: int, fields: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    names = parse_fields(fields, StudentResponse)
+    query = select(Student) if names is None else load_fields(select(Student), Student, names, derived=DERIVED_FIELDS)
+    student = await db.scalar(query.filter(Student.id == student_id))
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    
-    # Deserialize reasons for the response
-    if isinstance(student.reasons, str):  # If reasons is a JSON string
-        try:
-            student.reasons = json.loads(student.reasons)
-        except json.JSONDecodeError:
-            student.reasons = []  # Default to an empty list if deserialization fails
+    if names is not None:
+        return ORJSONResponse(pick(student, names))
     return student
 
+# GET endpoint to list the workshops a student is enrolled in (one lookup on workshop_students.student_id)
+@router.get("/students/{student_id}/workshops", response_model=List[WorkshopResponse])
+async def get_student_workshops(student_id: int, db: AsyncSession = Depends(get_db)):
+    query = select(Workshop).join(WorkshopStudent).filter(WorkshopStudent.student_id == student_id).order_by(Workshop.id)
+    return (await db.scalars(query)).all()
+
 # PUT endpoint to update a student by ID
 @router.put("/students/{student_id}", response_model=StudentResponse)
-async def update_student(student_id: int, updated_data: StudentUpdate, db: Session = Depends(get_db)):
+async def update_student(student_id: int, updated_data: StudentUpdate, db: AsyncSession = Depends(get_db)):
     # Query the student by ID
-    student = db.query(Student).filter(Student.id == student_id).first()
+    student = await db.scalar(select(Student).filter(Student.id == student_id))
     
     # If the student does not exist, raise a 404 error
     if not student:
@@ -76,34 +179,37 @@ async def update_student(student_id: int, updated_data: StudentUpdate, db: Sessi
     
     # Update the fields provided in the request body
     for key, value in updated_data.dict(exclude_unset=True).items():  # Use .dict() to convert to a dictionary
-        if key == "reasons" and isinstance(value, list):  # Serialize reasons if it's a list
-            value = json.dumps(value)
         if hasattr(student, key):  # Check if the field exists in the model
             setattr(student, key, value)
     
     # Commit the changes to the database
-    db.commit()
-    db.refresh(student)
-    
-    # Deserialize reasons for the response
-    if isinstance(student.reasons, str):  # If reasons is a JSON string
-        try:
-            student.reasons = json.loads(student.reasons)
-        except json.JSONDecodeError:
-            student.reasons = []  # Default to an empty list if deserialization fails
+    await commit_unique(db, "Student already exists")
+    await db.refresh(student)
+    await invalidate("students", student_id)
+    index_rows("students", [student])
+    record_rows("students", [student])
+    await publish("students", "updated", [student_id])
     return student
 # DELETE endpoint to delete a student by ID
 @router.delete("/students/{student_id}")
-async def delete_student(student_id: int, db: Session = Depends(get_db)):
+async def delete_student(student_id: int, db: AsyncSession = Depends(get_db)):
     # Query the student by ID
-    db_student = db.query(Student).filter(Student.id == student_id).first()
+    db_student = await db.scalar(select(Student).filter(Student.id == student_id))
     
     # If the student does not exist, raise a 404 error
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Delete the student from the database
-    db.delete(db_student)
-    db.commit()
+    # Delete the student from the database (their roster entries cascade)
+    roster_places = await workshops_of_students(db, [student_id])
+    workshop_ids = list(dict.fromkeys(roster_places))
+    await db.delete(db_student)
+    await db.commit()
+    await invalidate("students", student_id)
+    await invalidate("workshops", *workshop_ids)
+    unindex_rows("students", student_id)
+    forget_rows("students", [student_id], roster_places)
+    await publish("students", "deleted", [student_id])
+    await publish("workshops", "updated", workshop_ids)
     
     return {"message": "Student deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,252 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import lazyload
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Literal, Optional
+import codecs
+import csv
+import io
+import orjson
+import os
+import zlib
+
+from models.database import get_db, session
+from models.instructors import Instructor
+from models.students import Student
+from models.workshops import Workshop
+from schemas.instructors import InstructorCreate, InstructorResponse
+from schemas.students import StudentCreate, StudentResponse
+from schemas.workshops import WorkshopCreate, WorkshopResponse
+from routes.instructors import create_instructors_bulk, instructor_rows
+from routes.students import create_students_bulk, student_rows
+from routes.workshops import create_workshops_bulk, workshop_rows
+from routes.pagination import NDJSON_MEDIA_TYPE, STREAM_BATCH_SIZE
+
+# Initialize the router
+router = APIRouter()
+
+# Rows validated and inserted per transaction on import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+# Row errors kept in an import report; past this only the count grows
+MAX_IMPORT_ERRORS = int(os.getenv("MAX_IMPORT_ERRORS", "1000"))
+
+# Longest single row accepted, so a file without line breaks (or with an
+# unclosed quote) can't make the parser buffer the whole upload
+MAX_IMPORT_ROW_CHARS = int(os.getenv("MAX_IMPORT_ROW_CHARS", str(1024 * 1024)))
+
+# List fields are written to a single CSV cell, separated by semicolons
+LIST_SEPARATOR = ";"
+LIST_FIELDS = {"reasons", "skills", "instructors", "students"}
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+# entity -> (model, response schema and row encoder (for its rosters) for
+# exports, create schema and bulk handler for imports)
+ENTITIES = {
+    "students": (Student, StudentResponse, student_rows, StudentCreate, create_students_bulk),
+    "instructors": (Instructor, InstructorResponse, instructor_rows, InstructorCreate, create_instructors_bulk),
+    "workshops": (Workshop, WorkshopResponse, workshop_rows, WorkshopCreate, create_workshops_bulk),
+}
+
+def entity_spec(entity):
+    if entity not in ENTITIES:
+        raise HTTPException(status_code=404, detail=f"Unknown entity: {entity}")
+    return ENTITIES[entity]
+
+def csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join(str(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+# Rows of a select() from a server-side cursor, encoded a batch at a time,
+# with their rosters read from the link tables one IN query per batch. The
+# request's session is closed before the body is sent, so the stream opens
+# its own, plus a second one for the rosters: MySQL can't run other queries
+# on a connection while its server-side cursor is open.
+async def export_chunks(model, rows, names, file_format):
+    query = select(model).options(lazyload("*")).order_by(model.id).execution_options(yield_per=STREAM_BATCH_SIZE)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if file_format == "csv":
+        writer.writerow(names)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    async with session() as db, session() as roster_db:
+        result = await db.stream(query)
+        async for partition in result.scalars().partitions():
+            members = await rows.read_rosters(roster_db, [row.id for row in partition])
+            value = lambda row, name: members[name].get(row.id, []) if name in members else getattr(row, name)
+            if file_format == "csv":
+                writer.writerows([csv_cell(value(row, name)) for name in names] for row in partition)
+                chunk = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                chunk = "".join(orjson.dumps({name: value(row, name) for name in names}).decode() + "\n" for row in partition)
+            yield chunk.encode()
+
+async def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+# GET endpoint to download every row of an entity as CSV or NDJSON, streamed
+# from a server-side cursor (gzipped when the client accepts it)
+@router.get("/export/{entity}")
+async def export_entity(request: Request, entity: str, format: Literal["csv", "ndjson"] = "csv"):
+    model, response_model, rows, _, _ = entity_spec(entity)
+    # Columns and rosters; derived fields (thumbnails) are left out
+    names = [name for name in response_model.model_fields if name in model.__table__.columns or name in rows.rosters]
+    chunks = export_chunks(model, rows, names, format)
+    headers = {"Content-Disposition": f'attachment; filename="{entity}.{format}"'}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        chunks = gzipped(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    media_type = CSV_MEDIA_TYPE if format == "csv" else NDJSON_MEDIA_TYPE
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+# Most bytes gunzipped from an upload at a time
+MAX_INFLATED_CHUNK = 64 * 1024
+
+# Chunks of the request body as they arrive, gunzipped if need be. Each
+# compressed chunk is inflated MAX_INFLATED_CHUNK bytes at a time, so a
+# small upload that inflates hugely (a gzip bomb) is never held in memory
+# at once.
+async def body_chunks(request: Request):
+    decompressor = zlib.decompressobj(wbits=47) if request.headers.get("content-encoding") == "gzip" else None
+    async for chunk in request.stream():
+        if decompressor is None:
+            yield chunk
+            continue
+        while True:
+            data = decompressor.decompress(chunk, MAX_INFLATED_CHUNK)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+            if not chunk and len(data) < MAX_INFLATED_CHUNK:
+                break
+
+# Lines of the request body as they arrive
+async def body_lines(request: Request):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in body_chunks(request):
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+        if len(pending) > MAX_IMPORT_ROW_CHARS:
+            raise ValueError(f"Row longer than {MAX_IMPORT_ROW_CHARS} characters")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+# CSV records as dicts keyed by the header row. A quoted cell may span lines,
+# so lines are gathered until their quotes balance.
+async def csv_records(lines):
+    header, record = None, ""
+    async for line in lines:
+        record += line
+        if record.count('"') % 2:
+            if len(record) > MAX_IMPORT_ROW_CHARS:
+                raise ValueError(f"Row longer than {MAX_IMPORT_ROW_CHARS} characters")
+            continue
+        cells = next(csv.reader([record]), [])
+        record = ""
+        if not any(cell.strip() for cell in cells):
+            continue
+        if header is None:
+            header = [cell.strip() for cell in cells]
+            continue
+        yield {
+            name: (
+                None if cell == ""
+                else [item.strip() for item in cell.split(LIST_SEPARATOR) if item.strip()] if name in LIST_FIELDS
+                else cell
+            )
+            for name, cell in zip(header, cells)
+        }
+    if record.strip():
+        raise ValueError("Unterminated quoted field at end of file")
+
+async def ndjson_records(lines):
+    async for line in lines:
+        if line.strip():
+            yield orjson.loads(line)
+
+# Insert one batch through the entity's bulk-create handler (one transaction)
+async def import_batch(bulk_create, batch, report, db):
+    if not batch:
+        return
+    results = await bulk_create([item for _, item in batch], db)
+    for (row_number, _), result in zip(batch, results):
+        if result.status == "created":
+            report["created"] += 1
+        else:
+            add_error(report, row_number, result.detail)
+
+def add_error(report, row_number, detail):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_IMPORT_ERRORS:
+        report["errors"].append({"row": row_number, "detail": detail})
+
+def describe_errors(error: ValidationError):
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors())
+
+# POST endpoint to create rows from an uploaded CSV (header row first) or
+# NDJSON body. The body is parsed as it arrives, each row is validated with
+# the entity's create schema, and valid rows are inserted IMPORT_BATCH_SIZE at
+# a time. Send Content-Encoding: gzip for compressed uploads. The report
+# lists failed rows by their 1-based position (not counting the CSV header).
+@router.post("/import/{entity}")
+async def import_entity(
+    request: Request,
+    entity: str,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    _, _, _, create_model, bulk_create = entity_spec(entity)
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        if "csv" in content_type:
+            format = "csv"
+        elif "ndjson" in content_type or "jsonl" in content_type:
+            format = "ndjson"
+        else:
+            raise HTTPException(status_code=400, detail="Send text/csv or application/x-ndjson, or pass ?format=")
+
+    records = csv_records(body_lines(request)) if format == "csv" else ndjson_records(body_lines(request))
+    report = {"received": 0, "created": 0, "failed": 0, "errors": []}
+    batch = []
+    while True:
+        # Only parsing errors stop the import; a failing batch isn't one
+        try:
+            record = await anext(records, None)
+        except (ValueError, zlib.error) as error:  # Undecodable body, broken JSON line or gzip stream
+            report["aborted"] = f"Stopped after row {report['received']}: {error}"
+            break
+        if record is None:
+            break
+        report["received"] += 1
+        try:
+            batch.append((report["received"], create_model.model_validate(record)))
+        except ValidationError as error:
+            add_error(report, report["received"], describe_errors(error))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await import_batch(bulk_create, batch, report, db)
+            batch = []
+    await import_batch(bulk_create, batch, report, db)
+    return report
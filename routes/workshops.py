@@ -1,11 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from models.workshops import Workshop
-from schemas.workshops import WorkshopCreate, WorkshopResponse, WorkshopUpdate
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.instructors import Instructor
+from models.students import Student
+from models.workshops import Workshop, WorkshopInstructor, WorkshopStudent
+from schemas.workshops import (
+    InstructorSuggestion, WorkshopBulkUpdate, WorkshopCalendarEntry, WorkshopCreate, WorkshopExpandedResponse,
+    WorkshopResponse, WorkshopSuggestions, WorkshopUpdate, parse_workshop_date,
+)
+from schemas.bulk import MAX_BULK_SIZE, BulkDelete, BulkItemResult
+from schemas.instructors import InstructorResponse
+from schemas.students import StudentResponse
 from models.database import get_db
-from typing import List
+from routes.bulk import bulk_delete, bulk_insert, bulk_update, duplicate_key, existing_ids, missing_value, result_ids
+from routes.fields import dump_fields, fields_response, load_fields, parse_fields, pick
+from routes.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset, keyset_by, set_next_cursor, stream_ndjson
+from routes.rows import FAST_RESPONSES, RowEncoder
+from response_cache import invalidate
+from search import index_rows, unindex_rows
+from events import publish
+from stats import forget_rows, record_rows
+from matching import skill_index
+from collections import defaultdict
+from functools import partial
+from datetime import datetime, time, timedelta, timezone
+from typing import List, Literal, Optional, Union
 import logging
-import json
 
 # Initialize the router
 router = APIRouter()
@@ -13,73 +35,350 @@ router = APIRouter()
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+# Commit, turning a roster entry that points at no instructor or student, or
+# a subject and date another workshop already has, into a 400
+async def commit_rosters(db: AsyncSession):
+    try:
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        if duplicate_key(error):
+            raise HTTPException(status_code=400, detail="Workshop already exists")
+        if missing_value(error):
+            raise HTTPException(status_code=400, detail="Workshop subject and date can't be empty")
+        raise HTTPException(status_code=400, detail="Unknown instructor or student in roster")
+
 # POST endpoint to create a new workshop
 @router.post("/workshops/", response_model=WorkshopResponse)
-async def create_workshop(workshop: WorkshopCreate, db: Session = Depends(get_db)):
+async def create_workshop(workshop: WorkshopCreate, db: AsyncSession = Depends(get_db)):
     new_workshop = Workshop(
         subject=workshop.subject,
-        date=workshop.date,  # Store the formatted date as a string
-        instructors=json.dumps(workshop.instructors),  # Serialize list to JSON string
-        students=json.dumps(workshop.students),  # Serialize list to JSON string
+        date=workshop.date,  # Parsed to a datetime by the schema
+        instructors=workshop.instructors,  # Stored as rows in workshop_instructors
+        students=workshop.students,  # Stored as rows in workshop_students
         description=workshop.description,
     )
     db.add(new_workshop)
-    db.commit()
-    db.refresh(new_workshop)
-    # Deserialize JSON strings back to Python lists for the response
-    new_workshop.instructors = json.loads(new_workshop.instructors)
-    new_workshop.students = json.loads(new_workshop.students)
+    await commit_rosters(db)  # One INSERT for the workshop, one per roster
+    await invalidate("workshops")
+    index_rows("workshops", [new_workshop])
+    record_rows("workshops", [new_workshop])
+    await publish("workshops", "created", [new_workshop.id])
 
     return new_workshop
 
-# GET endpoint to retrieve all workshops
-@router.get("/workshops/", response_model=List[WorkshopResponse])
-async def get_workshops(db: Session = Depends(get_db)):
-    workshops = db.query(Workshop).all()
-    for workshop in workshops:
-        # Deserialize JSON strings back to Python lists
-        if isinstance(workshop.instructors, str):  # If instructors is a JSON string
-            try:
-                workshop.instructors = json.loads(workshop.instructors)
-            except json.JSONDecodeError:
-                workshop.instructors = []  # Default to an empty list if deserialization fails
-
-        if isinstance(workshop.students, str):  # If students is a JSON string
-            try:
-                workshop.students = json.loads(workshop.students)
-            except json.JSONDecodeError:
-                workshop.students = []  # Default to an empty list if deserialization fails
+# Find the roster ids in a batch that point at no instructor or student,
+# with one IN query per table
+async def unknown_roster_ids(db: AsyncSession, items):
+    instructor_ids = {int(i) for item in items for i in item.instructors or []}
+    student_ids = {int(i) for item in items for i in item.students or []}
+    return (
+        instructor_ids - await existing_ids(db, Instructor, instructor_ids),
+        student_ids - await existing_ids(db, Student, student_ids),
+    )
+
+def roster_error(item, unknown_instructors, unknown_students):
+    if any(int(i) in unknown_instructors for i in item.instructors or []):
+        return "Unknown instructor in roster"
+    if any(int(i) in unknown_students for i in item.students or []):
+        return "Unknown student in roster"
+    return None
+
+# Which of a batch's (subject, date) pairs another workshop already has, with one IN query
+async def existing_workshop_keys(db: AsyncSession, items):
+    keys = {(item.subject, item.date) for item in items if item.date is not None}
+    if not keys:
+        return set()
+    query = select(Workshop.subject, Workshop.date).filter(tuple_(Workshop.subject, Workshop.date).in_(keys))
+    return set((await db.execute(query)).tuples())
+
+# POST endpoint to create many workshops in one transaction
+@router.post("/workshops/bulk", response_model=List[BulkItemResult])
+async def create_workshops_bulk(
+    workshops: List[WorkshopCreate] = Body(..., max_length=MAX_BULK_SIZE), db: AsyncSession = Depends(get_db)
+):
+    unknown_instructors, unknown_students = await unknown_roster_ids(db, workshops)
+    existing = await existing_workshop_keys(db, workshops)
+
+    results, created = [], []
+    for index, workshop in enumerate(workshops):
+        error = roster_error(workshop, unknown_instructors, unknown_students)
+        if not error and (workshop.subject, workshop.date) in existing:
+            error = "Workshop already exists"
+        if error:
+            results.append(BulkItemResult(index=index, status="error", detail=error))
+            continue
+        existing.add((workshop.subject, workshop.date))  # Repeats within the batch are duplicates too
+        result = BulkItemResult(index=index, status="created")
+        new_workshop = Workshop(
+            subject=workshop.subject,
+            date=workshop.date,
+            instructors=workshop.instructors,
+            students=workshop.students,
+            description=workshop.description,
+        )
+        results.append(result)
+        created.append((result, new_workshop))
+
+    await bulk_insert(
+        db, Workshop, created, natural_key=("subject", "date"), links=("instructor_links", "student_links")
+    )
+    await invalidate("workshops")
+    index_rows("workshops", [row for _, row in created])
+    record_rows("workshops", [row for _, row in created])
+    await publish("workshops", "created", [row.id for _, row in created])
+    return results
+
+# PATCH endpoint to update many workshops in one transaction
+@router.patch("/workshops/bulk", response_model=List[BulkItemResult])
+async def update_workshops_bulk(
+    updates: List[WorkshopBulkUpdate] = Body(..., max_length=MAX_BULK_SIZE), db: AsyncSession = Depends(get_db)
+):
+    unknown_instructors, unknown_students = await unknown_roster_ids(db, updates)
+    results, updated = await bulk_update(
+        db, Workshop, updates, "Workshop not found",
+        check=lambda item: roster_error(item, unknown_instructors, unknown_students),
+        natural_key=("subject", "date"),
+        duplicate="Workshop already exists",
+    )
+    await invalidate("workshops", *result_ids(results, "updated"))
+    index_rows("workshops", updated)
+    record_rows("workshops", updated)
+    await publish("workshops", "updated", result_ids(results, "updated"))
+    return results
+
+# DELETE endpoint to delete many workshops by ID (their roster rows cascade)
+@router.delete("/workshops/bulk", response_model=List[BulkItemResult])
+async def delete_workshops_bulk(payload: BulkDelete, db: AsyncSession = Depends(get_db)):
+    results = await bulk_delete(db, Workshop, payload.ids, "Workshop not found")
+    await invalidate("workshops", *result_ids(results, "deleted"))
+    unindex_rows("workshops", *result_ids(results, "deleted"))
+    forget_rows("workshops", result_ids(results, "deleted"))
+    await publish("workshops", "deleted", result_ids(results, "deleted"))
+    return results
+
+# Serialize a workshop as one line of NDJSON
+def workshop_to_json(workshop):
+    return WorkshopResponse.model_validate(workshop).model_dump_json()
+
+# Roster fields and the relationships they are read from
+ROSTER_RELATIONSHIPS = {"instructors": Workshop.instructor_links, "students": Workshop.student_links}
+
+# Workshop pages as JSON straight from the rows (FAST_RESPONSES)
+workshop_rows = RowEncoder(
+    Workshop,
+    WorkshopResponse,
+    rosters={
+        "instructors": (WorkshopInstructor, "workshop_id", "instructor_id"),
+        "students": (WorkshopStudent, "workshop_id", "student_id"),
+    },
+)
+
+# select(Workshop), narrowed to the requested fields if there are any
+def workshop_query(names):
+    if names is None:
+        return select(Workshop)
+    return load_fields(select(Workshop), Workshop, names, ROSTER_RELATIONSHIPS)
+
+# Roster fields ?expand= can replace with the records they point at
+EXPANDABLE_ROSTERS = {"instructors": (Instructor, InstructorResponse), "students": (Student, StudentResponse)}
+
+def parse_expand(expand: Optional[str]):
+    if expand is None:
+        return []
+    names = list(dict.fromkeys(name.strip() for name in expand.split(",") if name.strip()))
+    unknown = [name for name in names if name not in EXPANDABLE_ROSTERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown expansions: {', '.join(unknown)}")
+    return names
+
+# Serialize workshops with their roster ids swapped for the instructor and
+# student records, loading each table once with an IN query over every id
+# on the page (rather than a request per roster entry from the frontend).
+# Whole workshops are checked against WorkshopExpandedResponse, the shape
+# the OpenAPI schema advertises for them.
+async def expanded_workshops(db: AsyncSession, workshops, names, expand):
+    rows = [WorkshopResponse.model_validate(w).model_dump() if names is None else pick(w, names) for w in workshops]
+    for roster in expand:
+        if names is not None and roster not in names:
+            continue
+        model, response_model = EXPANDABLE_ROSTERS[roster]
+        ids = {int(i) for row in rows for i in row[roster] or []}
+        records = {}
+        if ids:
+            for record in (await db.scalars(select(model).filter(model.id.in_(ids)))).all():
+                records[record.id] = response_model.model_validate(record, from_attributes=True).model_dump()
+        for row in rows:
+            row[roster] = [records[int(i)] for i in row[roster] or [] if int(i) in records]
+    if names is None:
+        rows = [WorkshopExpandedResponse.model_validate(row).model_dump() for row in rows]
+    return rows
 
+# GET endpoint to retrieve workshops, one keyset page at a time or streamed as NDJSON.
+# ?fields=id,subject,date loads and returns only those fields (rosters only when asked for).
+# ?expand=instructors,students embeds the roster records in place of their ids.
+# ?from=&to= keeps the workshops dated in [from, to); ?order=asc|desc sorts by date
+# instead of id. Both run as range scans on the workshops.date index.
+@router.get("/workshops/", response_model=Union[List[WorkshopResponse], List[WorkshopExpandedResponse]])
+async def get_workshops(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    fields: Optional[str] = None,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    order: Optional[Literal["asc", "desc"]] = None,
+    expand: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    names = parse_fields(fields, WorkshopResponse)
+    expand = parse_expand(expand)
+    filters = []
+    if from_ is not None:
+        filters.append(Workshop.date >= parse_workshop_date(from_))
+    if to is not None:
+        filters.append(Workshop.date < parse_workshop_date(to))
+    query = workshop_query(names).filter(*filters)
+
+    def page(limit, query=query):
+        if order is None:
+            return keyset(query, Workshop.id, after_id, limit)
+        return keyset_by(query, Workshop.date, Workshop.id, after_id, limit, descending=order == "desc")
+
+    if stream:
+        if expand:
+            raise HTTPException(status_code=400, detail="expand can't be combined with stream")
+        serialize = workshop_to_json if names is None else partial(dump_fields, names=names)
+        return stream_ndjson(page(limit), serialize)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    if FAST_RESPONSES and names is None and not expand:
+        rows = (await db.execute(page(limit, workshop_rows.query().filter(*filters)))).all()
+        set_next_cursor(response, rows[-1].id if rows else None, len(rows), limit)
+        return await workshop_rows.response(db, rows, response)
+    workshops = (await db.scalars(page(limit))).all()
+    set_next_cursor(response, workshops[-1].id if workshops else None, len(workshops), limit)
+    if expand:
+        return ORJSONResponse(await expanded_workshops(db, workshops, names, expand), headers=response.headers)
+    if names is not None:
+        return fields_response(workshops, names, response)
     return workshops
 
+# GET endpoint for the calendar: the next workshops from now, soonest first,
+# with just their id, subject and date
+@router.get("/workshops/upcoming", response_model=List[WorkshopCalendarEntry])
+async def get_upcoming_workshops(
+    days: Optional[int] = Query(None, ge=1, le=366),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # Dates are stored as naive UTC
+    query = select(Workshop.id, Workshop.subject, Workshop.date).filter(Workshop.date >= now)
+    if days is not None:
+        query = query.filter(Workshop.date < now + timedelta(days=days))
+    rows = await db.execute(query.order_by(Workshop.date, Workshop.id).limit(limit))
+    return ORJSONResponse([{"id": row.id, "subject": row.subject, "date": row.date} for row in rows])
+
+# Most workshops the batch suggestion endpoint ranks in one request
+MAX_SUGGESTION_WORKSHOPS = 5000
+
+# Who teaches on the given days: day -> instructor ids
+async def instructors_by_day(db: AsyncSession, days):
+    if not days:
+        return {}
+    start, end = datetime.combine(min(days), time()), datetime.combine(max(days), time()) + timedelta(days=1)
+    query = (
+        select(Workshop.date, WorkshopInstructor.instructor_id)
+        .join(WorkshopInstructor, WorkshopInstructor.workshop_id == Workshop.id)
+        .filter(Workshop.date >= start, Workshop.date < end)
+    )
+    by_day = defaultdict(set)
+    for date, instructor_id in await db.execute(query):
+        by_day[date.date()].add(instructor_id)
+    return by_day
+
+# Rank instructors for each workshop with the skill index. Instructors already
+# on a workshop are skipped, so anyone else teaching that day has a clash
+# and is penalized. Names come from one IN query.
+async def suggest_instructors(db: AsyncSession, workshops, limit):
+    by_day = await instructors_by_day(db, {workshop.date.date() for workshop in workshops if workshop.date})
+    requests = [
+        (
+            workshop.subject,
+            workshop.description,
+            {int(i) for i in workshop.instructors},
+            by_day.get(workshop.date.date(), set()) if workshop.date else set(),
+        )
+        for workshop in workshops
+    ]
+    ranked = skill_index.suggest(requests, limit)
+
+    ids = {instructor_id for suggestions in ranked for instructor_id, _, _, _ in suggestions}
+    names = dict((await db.execute(select(Instructor.id, Instructor.name).filter(Instructor.id.in_(ids)))).all()) if ids else {}
+    return [
+        [
+            {"id": i, "name": names[i], "score": round(score, 4), "matched_skills": matched, "conflict": conflict}
+            for i, score, matched, conflict in suggestions
+            if i in names
+        ]
+        for suggestions in ranked
+    ]
+
+# Only what ranking needs: the text, the date and the instructors already assigned
+SUGGESTION_FIELDS = ["id", "subject", "description", "date", "instructors"]
+
+# GET endpoint ranking instructors for every workshop dated in [from, to), e.g. a whole term
+@router.get("/workshops/suggested-instructors", response_model=List[WorkshopSuggestions])
+async def get_suggested_instructors_batch(
+    from_: datetime = Query(..., alias="from"),
+    to: datetime = Query(...),
+    limit: int = Query(5, ge=1, le=50),
+    db: AsyncSession = Depends(get_db),
+):
+    query = workshop_query(SUGGESTION_FIELDS).filter(
+        Workshop.date >= parse_workshop_date(from_), Workshop.date < parse_workshop_date(to)
+    )
+    workshops = (await db.scalars(query.order_by(Workshop.date, Workshop.id).limit(MAX_SUGGESTION_WORKSHOPS + 1))).all()
+    if len(workshops) > MAX_SUGGESTION_WORKSHOPS:
+        raise HTTPException(status_code=400, detail=f"More than {MAX_SUGGESTION_WORKSHOPS} workshops in range; narrow it")
+    suggestions = await suggest_instructors(db, workshops, limit)
+    return ORJSONResponse([{"workshop_id": w.id, "suggestions": s} for w, s in zip(workshops, suggestions)])
+
 # GET endpoint to retrieve a single workshop by ID
-@router.get("/workshops/{workshop_id}", response_model=WorkshopResponse)
-async def get_workshop(workshop_id: str, db: Session = Depends(get_db)):
-    workshop = db.query(Workshop).filter(Workshop.id == workshop_id).first()
+@router.get("/workshops/{workshop_id}", response_model=Union[WorkshopResponse, WorkshopExpandedResponse])
+async def get_workshop(
+    workshop_id: str, fields: Optional[str] = None, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)
+):
+    names = parse_fields(fields, WorkshopResponse)
+    expand = parse_expand(expand)
+    workshop = await db.scalar(workshop_query(names).filter(Workshop.id == workshop_id))
     if not workshop:
         raise HTTPException(status_code=404, detail="Workshop not found")
 
-    # Deserialize JSON strings back to Python lists
-    if isinstance(workshop.instructors, str):  # If instructors is a JSON string
-        try:
-            workshop.instructors = json.loads(workshop.instructors)
-        except json.JSONDecodeError:
-            workshop.instructors = []  # Default to an empty list if deserialization fails
-
-    if isinstance(workshop.students, str):  # If students is a JSON string
-        try:
-            workshop.students = json.loads(workshop.students)
-        except json.JSONDecodeError:
-            workshop.students = []  # Default to an empty list if deserialization fails
-
+    if expand:
+        return ORJSONResponse((await expanded_workshops(db, [workshop], names, expand))[0])
+    if names is not None:
+        return ORJSONResponse(pick(workshop, names))
     return workshop
 
 
+# GET endpoint ranking instructors for a workshop by how well their skills
+# cover its subject and description
+@router.get("/workshops/{workshop_id}/suggested-instructors", response_model=List[InstructorSuggestion])
+async def get_suggested_instructors(
+    workshop_id: int, limit: int = Query(10, ge=1, le=50), db: AsyncSession = Depends(get_db)
+):
+    workshop = await db.scalar(workshop_query(SUGGESTION_FIELDS).filter(Workshop.id == workshop_id))
+    if not workshop:
+        raise HTTPException(status_code=404, detail="Workshop not found")
+    return ORJSONResponse((await suggest_instructors(db, [workshop], limit))[0])
+
 # PUT endpoint to update a workshop by ID
 @router.put("/workshops/{workshop_id}", response_model=WorkshopResponse)
-async def update_workshop(workshop_id: int, updated_data: WorkshopUpdate, db: Session = Depends(get_db)):
+async def update_workshop(workshop_id: int, updated_data: WorkshopUpdate, db: AsyncSession = Depends(get_db)):
     # Query the workshop by ID
-    workshop = db.query(Workshop).filter(Workshop.id == workshop_id).first()
+    workshop = await db.scalar(select(Workshop).filter(Workshop.id == workshop_id))
     
     # If the workshop does not exist, raise a 404 error
     if not workshop:
@@ -88,44 +387,35 @@ async def update_workshop(workshop_id: int, updated_data: WorkshopUpdate, db: Se
     # Update the fields provided in the request body
     update_data = updated_data.dict(exclude_unset=True)  # Only include fields that are set
     for key, value in update_data.items():
-        if key == "instructors" and isinstance(value, list):  # Serialize instructors if it's a list
-            value = json.dumps(value)
-        if key == "students" and isinstance(value, list):  # Serialize students if it's a list
-            value = json.dumps(value)
-        setattr(workshop, key, value)
+        setattr(workshop, key, value)  # Rosters are rewritten as association rows
     
     # Commit the changes to the database
-    db.commit()
-    db.refresh(workshop)
-    
-    # Deserialize JSON fields for the response
-    if isinstance(workshop.instructors, str):  # If instructors is a JSON string
-        try:
-            workshop.instructors = json.loads(workshop.instructors)
-        except json.JSONDecodeError:
-            workshop.instructors = []  # Default to an empty list if deserialization fails
-
-    if isinstance(workshop.students, str):  # If students is a JSON string
-        try:
-            workshop.students = json.loads(workshop.students)
-        except json.JSONDecodeError:
-            workshop.students = []  # Default to an empty list if deserialization fails
+    await commit_rosters(db)
+    await db.refresh(workshop)
+    await invalidate("workshops", workshop_id)
+    index_rows("workshops", [workshop])
+    record_rows("workshops", [workshop])
+    await publish("workshops", "updated", [workshop_id])
 
     return workshop
 
 # DELETE endpoint to delete a workshop by ID
 @router.delete("/workshops/{workshop_id}")    
-async def delete_workshop(workshop_id: int, db: Session = Depends(get_db)):
+async def delete_workshop(workshop_id: int, db: AsyncSession = Depends(get_db)):
     # Query the workshop by ID
-    db_workshop = db.query(Workshop).filter(Workshop.id == workshop_id).first()
+    db_workshop = await db.scalar(select(Workshop).filter(Workshop.id == workshop_id))
     
     # If the workshop does not exist, raise a 404 error
     if not db_workshop:
         raise HTTPException(status_code=404, detail="Workshop not found")
     
     # Delete the workshop from the database
-    db.delete(db_workshop)
-    db.commit()
+    await db.delete(db_workshop)
+    await db.commit()
+    await invalidate("workshops", workshop_id)
+    unindex_rows("workshops", workshop_id)
+    forget_rows("workshops", [workshop_id])
+    await publish("workshops", "deleted", [workshop_id])
     
     return {"message": "Workshop deleted"}
 # Note: The above code assumes that the database connection and models are set up correctly.
\ No newline at end of file
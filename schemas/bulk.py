@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+import os
+
+# Largest number of items accepted by a single bulk request
+MAX_BULK_SIZE = int(os.getenv("MAX_BULK_SIZE", "1000"))
+
+class BulkDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BULK_SIZE)
+
+# Outcome of one item in a bulk request, in request order
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: Literal["created", "updated", "deleted", "error"]
+    detail: Optional[str] = None
@@ -20,4 +20,8 @@ class InstructorResponse(InstructorBase):
 class InstructorUpdate(BaseModel):
     name: Optional[str] = None
     skills: Optional[List[str]] = None  # JSON list
-    bio: Optional[str] = None
\ No newline at end of file
+    bio: Optional[str] = None
+
+# One entry of a bulk update: the id plus the fields to change
+class InstructorBulkUpdate(InstructorUpdate):
+    id: int
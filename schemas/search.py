@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Literal
+
+# One ranked match: the row, its display name (name or subject) and its score
+class SearchResult(BaseModel):
+    type: Literal["instructors", "students", "workshops"]
+    id: int
+    title: str
+    score: float
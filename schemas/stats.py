@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+from typing import List
+
+# How many rows carry one label (a skill or a reason)
+class LabelCount(BaseModel):
+    label: str
+    count: int
+
+# Skill or reason frequencies: rows counted, distinct labels, the most common first
+class LabelStats(BaseModel):
+    rows: int
+    distinct: int
+    top: List[LabelCount]
+
+# How many workshops (or instructors) have a given size (or load)
+class DistributionBucket(BaseModel):
+    size: int
+    count: int
+
+# One of the largest workshops or busiest instructors
+class RankedRow(BaseModel):
+    id: int
+    title: str
+    size: int
+
+# Students per workshop, or workshops per instructor
+class DistributionStats(BaseModel):
+    count: int
+    total: int
+    mean: float
+    median: float
+    max: int
+    distribution: List[DistributionBucket]
+    top: List[RankedRow]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class StudentCreate(BaseModel):
     name: str   
@@ -11,6 +11,7 @@ class StudentResponse(BaseModel):
     name: str
     reasons: Optional[List[str]]  # JSON array
     picture: Optional[str]  
+    thumbnails: Optional[Dict[str, str]] = None  # "96.webp" -> URL, for uploaded pictures
 
 class StudentUpdate(BaseModel):
     name: Optional[str] = None
@@ -18,4 +19,8 @@ class StudentUpdate(BaseModel):
     picture: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# One entry of a bulk update: the id plus the fields to change
+class StudentBulkUpdate(StudentUpdate):
+    id: int
@@ -1,15 +1,57 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, field_validator
+from datetime import date, datetime, time, timezone
+from dateutil import parser as dateutil_parser
+from typing import List, Optional, Union
+import os
+
+from schemas.instructors import InstructorResponse
+from schemas.students import StudentResponse
+
+# Ambiguous legacy dates like 03/04/2025 are read day first (UK style)
+WORKSHOP_DATE_DAYFIRST = os.getenv("WORKSHOP_DATE_DAYFIRST", "true").lower() == "true"
+
+# Workshop dates arrive as ISO strings or in the preformatted style the
+# column used to store ("Tuesday 4 March 2025 18:30", "04/03/2025", ...).
+# They're stored as naive UTC datetimes.
+def parse_workshop_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, time())
+    else:
+        text = str(value).strip()
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            try:
+                parsed = dateutil_parser.parse(text, dayfirst=WORKSHOP_DATE_DAYFIRST)
+            except (ValueError, OverflowError):
+                raise ValueError(f"unrecognised date {text!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+# Roster entries are instructor/student ids, sent as strings
+def check_roster_ids(ids):
+    for entry in ids or []:
+        if not str(entry).isdigit():
+            raise ValueError(f"roster entries must be numeric ids, got {entry!r}")
+    return ids
 
 class WorkshopBase(BaseModel):
     subject: str
-    date: Optional[str] = None  # Store the formatted date as a string
-    instructors: Optional[List[str]] = None  # JSON list
-    students: Optional[List[str]] = None  # JSON list
+    date: Optional[datetime] = None  # ISO or the legacy preformatted string
+    instructors: Optional[List[str]] = None  # Instructor ids
+    students: Optional[List[str]] = None  # Student ids
     description: Optional[str] = None
 
+    _check_rosters = field_validator("instructors", "students")(check_roster_ids)
+    _parse_date = field_validator("date", mode="before")(parse_workshop_date)
+
 class WorkshopCreate(WorkshopBase):
-    pass
+    date: datetime  # Required: the column is NOT NULL
 
 class WorkshopResponse(WorkshopBase):
     id: int
@@ -17,10 +59,48 @@ class WorkshopResponse(WorkshopBase):
     class Config:
         from_attributes = True  # For SQLAlchemy model compatibility
 
+# A workshop fetched with ?expand=: the expanded rosters list instructor and
+# student records, the others still list ids
+class WorkshopExpandedResponse(BaseModel):
+    subject: str
+    date: datetime
+    instructors: Optional[List[Union[InstructorResponse, str]]] = None
+    students: Optional[List[Union[StudentResponse, str]]] = None
+    description: Optional[str] = None
+    id: int
+
 # Add this class for updates
 class WorkshopUpdate(BaseModel):
     subject: Optional[str] = None
-    date: Optional[str] = None
+    date: Optional[datetime] = None
     instructors: Optional[List[str]] = None
     students: Optional[List[str]] = None
-    description: Optional[str] = None
\ No newline at end of file
+    description: Optional[str] = None
+
+    _check_rosters = field_validator("instructors", "students")(check_roster_ids)
+    _parse_date = field_validator("date", mode="before")(parse_workshop_date)
+
+# One entry of a bulk update: the id plus the fields to change
+class WorkshopBulkUpdate(WorkshopUpdate):
+    id: int
+
+# A workshop as the calendar view needs it
+class WorkshopCalendarEntry(BaseModel):
+    id: int
+    subject: str
+    date: datetime
+
+# An instructor suggested for a workshop: score is the share of the
+# workshop's (weighted) skill words they cover, reduced when they already
+# teach another workshop that day (conflict)
+class InstructorSuggestion(BaseModel):
+    id: int
+    name: str
+    score: float
+    matched_skills: List[str]
+    conflict: bool
+
+# Suggestions for one workshop of a batch
+class WorkshopSuggestions(BaseModel):
+    workshop_id: int
+    suggestions: List[InstructorSuggestion]
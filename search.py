@@ -0,0 +1,200 @@
+from array import array
+from sqlalchemy import select
+from dotenv import load_dotenv
+from models.database import SessionLocal
+from models.instructors import Instructor
+from models.students import Student
+from models.workshops import Workshop
+import asyncio
+import bisect
+import heapq
+import math
+import os
+import re
+import sys
+
+# Load environment variables
+load_dotenv()
+
+# In-memory inverted index over the free-text fields of the three entities,
+# built at startup (build_search_index) and kept current by the routers.
+# Each uvicorn worker holds its own copy and only sees its own writes, so
+# SEARCH_INDEX_REFRESH_SECONDS rebuilds it periodically when running several.
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "0"))
+SEARCH_BUILD_BATCH_SIZE = int(os.getenv("SEARCH_BUILD_BATCH_SIZE", "5000"))
+
+# Indexed attributes per entity, with how much a match in each counts
+SEARCH_FIELDS = {
+    "instructors": [("skills", 3.0), ("bio", 1.0)],
+    "students": [("reasons", 1.0)],
+    "workshops": [("subject", 3.0), ("description", 1.0)],
+}
+ENTITY_CODES = {entity: code for code, entity in enumerate(SEARCH_FIELDS)}
+
+# Documents are stored as entity code << ID_BITS | id, so a table read in id
+# order appends to the end of each posting list
+ID_BITS = 40
+ID_MASK = (1 << ID_BITS) - 1
+
+def document_key(entity, row_id):
+    return ENTITY_CODES[entity] << ID_BITS | row_id
+
+# A query term also matches longer terms it's a prefix of, at a discount
+PREFIX_WEIGHT = 0.5
+MAX_PREFIX_EXPANSIONS = 200
+
+STOPWORDS = {"a", "an", "and", "at", "for", "in", "is", "of", "on", "or", "the", "to", "with"}
+TOKEN = re.compile(r"\w+")
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+def field_text(value):
+    if value is None:
+        return ""
+    return " ".join(value) if isinstance(value, list) else str(value)
+
+class Postings:
+    __slots__ = ("docs", "weights")
+
+    # Parallel arrays sorted by document key: 12 bytes a posting
+    def __init__(self):
+        self.docs = array("q")
+        self.weights = array("f")
+
+    def add(self, doc, weight):
+        if not self.docs or doc > self.docs[-1]:
+            self.docs.append(doc)
+            self.weights.append(weight)
+            return
+        index = bisect.bisect_left(self.docs, doc)
+        self.docs.insert(index, doc)
+        self.weights.insert(index, weight)
+
+    def remove(self, doc):
+        index = bisect.bisect_left(self.docs, doc)
+        if index < len(self.docs) and self.docs[index] == doc:
+            del self.docs[index]
+            del self.weights[index]
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}  # term -> Postings
+        self.terms = []  # Sorted vocabulary, for prefix lookups
+        self.documents = {}  # document key -> the terms it was indexed under
+
+    def __len__(self):
+        return len(self.documents)
+
+    def replace(self, other):
+        self.postings, self.terms, self.documents = other.postings, other.terms, other.documents
+
+    def stats(self):
+        return {
+            "documents": len(self.documents),
+            "terms": len(self.terms),
+            "postings": sum(len(postings.docs) for postings in self.postings.values()),
+        }
+
+    # Index (or re-index) one row; `fields` is a list of (text, weight)
+    def update(self, entity, row_id, fields):
+        doc = document_key(entity, row_id)
+        self.discard(doc)
+        weights = {}
+        for text, weight in fields:
+            for token in tokenize(text):
+                token = sys.intern(token)  # One copy of each term, shared by every document using it
+                weights[token] = weights.get(token, 0.0) + weight
+        for term, weight in weights.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = Postings()
+                bisect.insort(self.terms, term)
+            postings.add(doc, weight)
+        if weights:
+            self.documents[doc] = tuple(weights)
+
+    def remove(self, entity, *row_ids):
+        for row_id in row_ids:
+            self.discard(document_key(entity, row_id))
+
+    def discard(self, doc):
+        for term in self.documents.pop(doc, ()):
+            postings = self.postings[term]
+            postings.remove(doc)
+            if not postings.docs:
+                del self.postings[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+
+    # The indexed terms a query token matches, with the weight of each match
+    def expand(self, token):
+        start = bisect.bisect_left(self.terms, token)
+        for term in self.terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            yield term, 1.0 if term == token else PREFIX_WEIGHT
+
+    # Rank the documents matching every query token, exactly or as a prefix,
+    # by the summed weight of their matches times the terms' rarity
+    def search(self, query, entities=None, limit=20):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        codes = {ENTITY_CODES[entity] for entity in entities or SEARCH_FIELDS}
+        total = len(self.documents)
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term, match in self.expand(token):
+                postings = self.postings[term]
+                idf = math.log(1 + total / len(postings.docs))
+                for doc, weight in zip(postings.docs, postings.weights):
+                    if doc >> ID_BITS in codes and (scores is None or doc in scores):
+                        score = weight * match * idf
+                        if score > token_scores.get(doc, 0.0):
+                            token_scores[doc] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc: score + token_scores[doc] for doc, score in scores.items() if doc in token_scores}
+            if not scores:
+                return []
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        entities = list(SEARCH_FIELDS)
+        return [(entities[doc >> ID_BITS], doc & ID_MASK, score) for doc, score in best]
+
+search_index = SearchIndex()
+
+# Keep the index in step with rows the routers have just written
+def index_rows(entity, rows):
+    if not SEARCH_INDEX_ENABLED:
+        return
+    fields = SEARCH_FIELDS[entity]
+    for row in rows:
+        search_index.update(entity, row.id, [(field_text(getattr(row, name)), weight) for name, weight in fields])
+
+def unindex_rows(entity, *row_ids):
+    if SEARCH_INDEX_ENABLED:
+        search_index.remove(entity, *row_ids)
+
+# Read the indexed columns of every row into a fresh index, then swap it in
+async def build_search_index():
+    if not SEARCH_INDEX_ENABLED:
+        return
+    models = {"instructors": Instructor, "students": Student, "workshops": Workshop}
+    index = SearchIndex()
+    async with SessionLocal() as db:
+        for entity, fields in SEARCH_FIELDS.items():
+            model = models[entity]
+            columns = [model.id] + [getattr(model, name) for name, _ in fields]
+            result = await db.stream(select(*columns).execution_options(yield_per=SEARCH_BUILD_BATCH_SIZE))
+            async for row in result:
+                index.update(entity, row[0], [(field_text(value), weight) for value, (_, weight) in zip(row[1:], fields)])
+    search_index.replace(index)
+
+# Rebuild every SEARCH_INDEX_REFRESH_SECONDS, to pick up other workers' writes
+async def refresh_search_index():
+    while True:
+        await asyncio.sleep(SEARCH_INDEX_REFRESH_SECONDS)
+        await build_search_index()
@@ -0,0 +1,288 @@
+from collections import Counter
+from sqlalchemy import String, select, type_coerce
+from dotenv import load_dotenv
+from models.database import SessionLocal
+from models.instructors import Instructor
+from models.students import Student
+from models.types import decode_list
+from models.workshops import Workshop, WorkshopInstructor, WorkshopStudent
+import asyncio
+import numpy as np
+import os
+import pandas as pd
+
+# Load environment variables
+load_dotenv()
+
+# Dashboard statistics (skill and reason frequencies, students per workshop,
+# instructor load), kept as in-memory snapshots. They're built at startup
+# from the tables (build_stats) and then kept current by the routers, so a
+# /stats request reads them instead of aggregating the tables. Like the
+# search index, each uvicorn worker only sees its own writes;
+# STATS_REFRESH_SECONDS rebuilds them periodically when running several.
+STATS_ENABLED = os.getenv("STATS_ENABLED", "true").lower() == "true"
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "0"))
+STATS_BUILD_BATCH_SIZE = int(os.getenv("STATS_BUILD_BATCH_SIZE", "50000"))
+
+# Make sure array[index] exists, growing by doubling; new slots hold `fill`
+def grow(array, index, fill):
+    if index < len(array):
+        return array
+    grown = np.full(max(index + 1, len(array) * 2), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+# How many rows carry each label: the reasons on students, the skills on
+# instructors. Each row's labels are stored as the code of its label set,
+# in an array indexed by row id, so most rows cost four bytes.
+class LabelCounts:
+    def __init__(self):
+        self.codes = np.full(0, -1, np.int32)  # row id -> label set code; -1 for no row
+        self.sets = []  # code -> tuple of labels
+        self.set_codes = {}  # tuple of labels -> code
+        self.counts = Counter()  # label -> rows carrying it
+        self.rows = 0
+
+    def code(self, labels):
+        labels = tuple(dict.fromkeys(str(label) for label in labels or ()))
+        code = self.set_codes.get(labels)
+        if code is None:
+            code = self.set_codes[labels] = len(self.sets)
+            self.sets.append(labels)
+        return code
+
+    def set(self, row_id, labels):
+        self.remove(row_id)
+        self.codes = grow(self.codes, row_id, -1)
+        code = self.code(labels)
+        self.codes[row_id] = code
+        self.counts.update(self.sets[code])
+        self.rows += 1
+
+    def remove(self, row_id):
+        if row_id >= len(self.codes) or self.codes[row_id] < 0:
+            return
+        for label in self.sets[self.codes[row_id]]:
+            self.counts[label] -= 1
+            if not self.counts[label]:
+                del self.counts[label]
+        self.codes[row_id] = -1
+        self.rows -= 1
+
+    # Add rows from their ids and stored (still encoded) values. Identical
+    # values are decoded once and counted together.
+    def load(self, ids, raw):
+        positions, uniques = pd.factorize(pd.Series(raw, dtype=object), use_na_sentinel=True)
+        mapping = np.array([self.code(decode_list(value)) for value in uniques] + [self.code(())], dtype=np.int32)
+        row_codes = mapping[positions]  # The sentinel -1 picks the empty set at the end
+        self.codes = grow(self.codes, int(ids.max()), -1)
+        self.codes[ids] = row_codes
+        for code, rows in enumerate(np.bincount(row_codes, minlength=len(self.sets))):
+            if rows:
+                for label in self.sets[code]:
+                    self.counts[label] += int(rows)
+        self.rows += len(ids)
+
+    def existing(self):
+        return np.flatnonzero(self.codes >= 0)
+
+# Workshop rosters as counts: students enrolled per workshop, workshops per
+# instructor. The instructor links read at build time are kept as a
+# compressed sparse row (CSR) layout. Workshops written since then override
+# it through a dict, so a change can be undone exactly.
+class RosterCounts:
+    def __init__(self):
+        self.students = np.full(0, -1, np.int32)  # workshop id -> students; -1 for no workshop
+        self.load = np.zeros(0, np.int32)  # instructor id -> workshops taught
+        self.link_starts = np.zeros(1, np.int64)  # workshop id -> offset into link_instructors (CSR)
+        self.link_instructors = np.zeros(0, np.int32)
+        self.written = {}  # workshop id -> instructor ids, for workshops written since the build
+
+    def instructors_of(self, workshop_id):
+        if workshop_id in self.written:
+            return self.written[workshop_id]
+        if workshop_id + 1 >= len(self.link_starts):
+            return ()
+        start, end = self.link_starts[workshop_id], self.link_starts[workshop_id + 1]
+        return tuple(int(i) for i in self.link_instructors[start:end])
+
+    def set_workshop(self, workshop_id, instructor_ids, student_count):
+        self.remove_workshop(workshop_id)
+        instructor_ids = tuple(dict.fromkeys(instructor_ids))
+        self.students = grow(self.students, workshop_id, -1)
+        self.students[workshop_id] = student_count
+        self.written[workshop_id] = instructor_ids
+        if instructor_ids:
+            self.load = grow(self.load, max(instructor_ids), 0)
+            np.add.at(self.load, list(instructor_ids), 1)
+
+    def remove_workshop(self, workshop_id):
+        if workshop_id >= len(self.students) or self.students[workshop_id] < 0:
+            return
+        instructor_ids = self.instructors_of(workshop_id)
+        if instructor_ids:
+            np.subtract.at(self.load, list(instructor_ids), 1)
+        self.students[workshop_id] = -1
+        self.written[workshop_id] = ()
+
+    # Deleted students leave a place in each workshop listed (once per place)
+    def remove_students(self, workshop_ids):
+        workshop_ids = [i for i in workshop_ids if i < len(self.students) and self.students[i] > 0]
+        if workshop_ids:
+            np.subtract.at(self.students, workshop_ids, 1)
+
+    # A deleted instructor drops off the rosters of the workshops listed
+    def remove_instructor(self, instructor_id, workshop_ids):
+        for workshop_id in workshop_ids:
+            self.written[workshop_id] = tuple(i for i in self.instructors_of(workshop_id) if i != instructor_id)
+        if instructor_id < len(self.load):
+            self.load[instructor_id] = 0
+
+    def load_workshops(self, ids):
+        self.students = grow(self.students, int(ids.max()), -1)
+        self.students[ids] = 0
+
+    def load_student_links(self, workshop_ids):
+        counts = np.bincount(workshop_ids)
+        self.students = grow(self.students, len(counts) - 1, -1)
+        self.students[:len(counts)] += counts.astype(np.int32)
+
+    def load_instructor_links(self, workshop_ids, instructor_ids):
+        order = np.argsort(workshop_ids, kind="stable")
+        self.link_instructors = instructor_ids[order].astype(np.int32)
+        self.link_starts = np.concatenate(([0], np.cumsum(np.bincount(workshop_ids)))).astype(np.int64)
+        self.load = np.bincount(instructor_ids).astype(np.int32)
+
+class Stats:
+    def __init__(self):
+        self.reasons = LabelCounts()  # Over students
+        self.skills = LabelCounts()  # Over instructors
+        self.rosters = RosterCounts()
+        self.summaries = {}  # (name, limit) -> summary, until the next change
+
+    def replace(self, other):
+        self.reasons, self.skills, self.rosters = other.reasons, other.skills, other.rosters
+        self.changed()
+
+    def changed(self):
+        self.summaries.clear()
+
+    # A summary computed from the snapshot, reused until the next change
+    def summary(self, name, limit, compute):
+        key = (name, limit)
+        if key not in self.summaries:
+            self.summaries[key] = compute(limit)
+        return self.summaries[key]
+
+    def labels(self, counts, rows, limit):
+        return {"rows": rows, "distinct": len(counts), "top": counts.most_common(limit)}
+
+    def skill_counts(self, limit):
+        return self.summary("skills", limit, lambda limit: self.labels(self.skills.counts, self.skills.rows, limit))
+
+    def reason_counts(self, limit):
+        return self.summary("reasons", limit, lambda limit: self.labels(self.reasons.counts, self.reasons.rows, limit))
+
+    # Mean, median, max, the distribution of values and the top ids
+    def distribution(self, ids, values, limit):
+        if not len(values):
+            return {"count": 0, "total": 0, "mean": 0.0, "median": 0.0, "max": 0, "distribution": [], "top": []}
+        sizes, frequencies = np.unique(values, return_counts=True)
+        top = np.argsort(-values, kind="stable")[:limit]
+        return {
+            "count": int(len(values)),
+            "total": int(values.sum()),
+            "mean": float(values.mean()),
+            "median": float(np.median(values)),
+            "max": int(values.max()),
+            "distribution": [(int(size), int(frequency)) for size, frequency in zip(sizes, frequencies)],
+            "top": [(int(ids[i]), int(values[i])) for i in top],
+        }
+
+    def workshop_sizes(self, limit):
+        def compute(limit):
+            ids = np.flatnonzero(self.rosters.students >= 0)
+            return self.distribution(ids, self.rosters.students[ids].astype(np.int64), limit)
+        return self.summary("workshops", limit, compute)
+
+    def instructor_load(self, limit):
+        def compute(limit):
+            ids = self.skills.existing()  # Every instructor, including those teaching nothing
+            load = grow(self.rosters.load, int(ids.max()) if len(ids) else 0, 0)
+            return self.distribution(ids, load[ids].astype(np.int64), limit)
+        return self.summary("instructors", limit, compute)
+
+stats = Stats()
+
+# Keep the snapshots in step with rows the routers have just written
+def record_rows(entity, rows):
+    if not STATS_ENABLED:
+        return
+    for row in rows:
+        if entity == "students":
+            stats.reasons.set(row.id, row.reasons)
+        elif entity == "instructors":
+            stats.skills.set(row.id, row.skills)
+        else:
+            stats.rosters.set_workshop(row.id, [int(i) for i in row.instructors], len(row.students))
+    stats.changed()
+
+# Rows the routers have just deleted. `roster_places` lists, for deleted
+# students or instructors, the workshops whose rosters they were on (once
+# per place they held).
+def forget_rows(entity, ids, roster_places=()):
+    if not STATS_ENABLED:
+        return
+    for row_id in ids:
+        if entity == "students":
+            stats.reasons.remove(row_id)
+        elif entity == "instructors":
+            stats.skills.remove(row_id)
+            stats.rosters.remove_instructor(row_id, roster_places)
+        else:
+            stats.rosters.remove_workshop(row_id)
+    if entity == "students":
+        stats.rosters.remove_students(roster_places)
+    stats.changed()
+
+# Stream a select() in batches, each column as a numpy array of ints (or,
+# for the columns listed in `raw`, as a list of the values read)
+async def stream_columns(db, query, raw=()):
+    result = await db.stream(query.execution_options(yield_per=STATS_BUILD_BATCH_SIZE))
+    async for partition in result.partitions():
+        yield [
+            [row[i] for row in partition] if i in raw else np.fromiter((row[i] for row in partition), np.int64, len(partition))
+            for i in range(len(partition[0]))
+        ]
+
+async def read_columns(db, query):
+    batches = [columns async for columns in stream_columns(db, query)]
+    return [np.concatenate(column) for column in zip(*batches)] if batches else None
+
+# Read the tables into fresh snapshots, then swap them in. Reasons and skills
+# are read still encoded, so each distinct list is decoded once.
+async def build_stats():
+    if not STATS_ENABLED:
+        return
+    fresh = Stats()
+    async with SessionLocal() as db:
+        for labels, model, column in ((fresh.reasons, Student, Student.reasons), (fresh.skills, Instructor, Instructor.skills)):
+            async for ids, raw in stream_columns(db, select(model.id, type_coerce(column, String)), raw=(1,)):
+                labels.load(ids, raw)
+
+        workshops = await read_columns(db, select(Workshop.id))
+        if workshops:
+            fresh.rosters.load_workshops(workshops[0])
+        places = await read_columns(db, select(WorkshopStudent.workshop_id))
+        if places:
+            fresh.rosters.load_student_links(places[0])
+        links = await read_columns(db, select(WorkshopInstructor.workshop_id, WorkshopInstructor.instructor_id))
+        if links:
+            fresh.rosters.load_instructor_links(*links)
+    stats.replace(fresh)
+
+# Rebuild every STATS_REFRESH_SECONDS, to pick up other workers' writes
+async def refresh_stats():
+    while True:
+        await asyncio.sleep(STATS_REFRESH_SECONDS)
+        await build_stats()